@@ -3,15 +3,12 @@ from tkinter import font as tkfont
 from tkinter import colorchooser, messagebox
 import customtkinter as ctk
 import soundcard as sc
-import vosk
 import queue
 import threading
 import json
 import sys
 import os
-import numpy as np
 import collections
-import textwrap
 import time
 import webbrowser
 import requests
@@ -19,9 +16,13 @@ import zipfile
 import subprocess
 # New import for translation backends
 from translator import get_translator, MarianTranslator, get_available_argos_languages
-import argostranslate.package
-import argostranslate.translate
-from transformers import MarianMTModel, MarianTokenizer
+from engine import TranscriptionEngine, PARTIAL_POLICIES
+from audio import AudioBuffer, BlockSizeController, PcmRing, OVERLOAD_POLICIES
+from caption_layout import CaptionLayout
+from metrics import MetricsServer, latency_tracker
+from models import model_registry
+from broadcast import CaptionBroadcaster, CaptionLogSink, SSEServer
+from subtitles import SubtitleWriter
 
 # --- Constants ---
 SETTINGS_FILE = "settings.json"
@@ -29,6 +30,10 @@ VOSK_MODELS_URL = "https://alphacephei.com/vosk/models"
 DEVELOPER_URL = "https://github.com/sally4d"
 LinkedIn_URL = "https://www.linkedin.com/in/oscurprof/"
 SUPPORT_URL = "https://oscurprofundo.gumroad.com/l/dmkbes"
+# Used when 'audio_sources' is empty: loopback of the default speaker, as before multi-source capture.
+DEFAULT_AUDIO_SOURCE = {"device": "default", "loopback": True}
+# The Partial Updates/s slider goes one step past 20; that last position means no limit (0).
+PARTIAL_RATE_NO_LIMIT = 21
 
 # --- Language Model Definitions ---
 LANGUAGE_MODELS = {
@@ -133,12 +138,25 @@ LANGUAGE_MODELS = {
 }
 
 # --- Global Queues ---
-audio_queue = queue.Queue()
-caption_queue = queue.Queue()
+audio_queue = AudioBuffer()
+# Engines publish to the broadcaster; the overlay reads its own subscription like a queue.
+caption_broadcaster = CaptionBroadcaster()
+caption_queue = caption_broadcaster.subscribe("overlay")
 
 # --- Global State ---
 last_caption_time = time.time()
 stop_threads = threading.Event()
+caption_notifier = None  # Set by CaptionWindow; wakes the Tk loop when captions are queued.
+metrics_server = None  # Started in main() only when 'metrics_enabled' is set.
+sse_server = None  # Started in main() only when 'sse_enabled' is set.
+block_sizers = []  # One BlockSizeController per audio source, shared by its capture thread and engine.
+recognition_engines = []  # One running TranscriptionEngine per audio source; settings changes are reloaded into them.
+
+
+def notify_caption_window():
+    """Tells the caption window that new captions are queued, once it exists."""
+    if caption_notifier:
+        caption_notifier()
 
 
 class ToolTip:
@@ -263,11 +281,33 @@ class SettingsManager:
             "subtitle_font": "Arial",
             "language": "English",  # default language
             "block_size": 3000,
+            "block_size_adaptive": False,
+            "block_size_min": 1000,
+            "block_size_max": 8000,
             "model_path": LANGUAGE_MODELS["English"],
             "window_width": 1200,
             "window_height": 70,
             "window_padding": 20,
             "delay_threshold": 3.0,
+            "audio_queue_max_blocks": 32,
+            "audio_overload_policy": "skip_to_live",
+            "vad_enabled": False,
+            "vad_threshold_db": -50.0,
+            "vad_hangover": 0.6,
+            "vad_preroll": 0.3,
+            "vad_spectral": True,
+            "latency_alert_seconds": 5.0,
+            "metrics_enabled": False,
+            "metrics_port": 9464,
+            "sse_enabled": False,
+            "sse_port": 9465,
+            "sse_allow_origin": "",
+            "caption_log_path": "",
+            "subtitle_path": "",
+            "subtitle_format": "",
+            "subtitle_rotate_minutes": 0,
+            "preload_models": True,
+            "audio_sources": [],
             "ran_before": False,
             "show_about_on_startup": True,
             "appearance_mode": "dark",
@@ -275,6 +315,19 @@ class SettingsManager:
             "translation_enabled": False,
             "translation_target_language": "Spanish",
             "translation_backend": "ArgosTranslate",
+            "translation_workers": 1,
+            "translation_max_batch": 8,
+            "partial_translation_policy": "always",
+            "partial_max_rate": 5.0,
+            "partial_translation_debounce": 0.5,
+            "partial_translation_min_words": 2,
+            "translation_cache_size": 2048,
+            "translation_cache_persistent": False,
+            "translation_cache_disk_entries": 100000,
+            "marian_num_beams": None,
+            "marian_max_new_tokens": None,
+            "marian_quantize": False,
+            "torch_num_threads": None,
         }
         self.settings, self.is_first_run = self.load_settings()
 
@@ -389,12 +442,12 @@ class SettingsWindow(ctk.CTkToplevel):
         self.restart_callback = restart_callback
         self.settings = self.settings_manager.settings.copy()
 
-        self.initial_language = self.settings['language']
-        self.initial_block_size = self.settings['block_size']
+        self.applied_block_size = (self.settings['block_size'], self.settings['block_size_adaptive'])
         self.initial_appearance_mode = self.settings['appearance_mode']
 
         self.language_models = LANGUAGE_MODELS
-        self.argos_languages = get_available_argos_languages()
+        # Fetched on first use: it imports argostranslate and refreshes the package index.
+        self._argos_languages = None
         self.marian_languages = sorted(list(MarianTranslator.LANG_CODE_MAP.keys()))
 
         self.setup_ui()
@@ -516,6 +569,44 @@ class SettingsWindow(ctk.CTkToplevel):
         self.delay_slider.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
         self.delay_label = ctk.CTkLabel(audio_frame, text="", width=40)
         self.delay_label.grid(row=5, column=2, padx=10, pady=5, sticky="w")
+        overload_label = ctk.CTkLabel(audio_frame, text="When Behind:")
+        overload_label.grid(row=6, column=0, padx=10, pady=5, sticky="w")
+        self.overload_policy_menu = ctk.CTkOptionMenu(audio_frame, values=list(OVERLOAD_POLICIES),
+                                                      command=self.update_setting)
+        self.overload_policy_menu.grid(row=6, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
+        ToolTip(overload_label,
+                "What to do when recognition cannot keep up with the audio.\n"
+                "skip_to_live: jump back to live audio and show '[skipped N s]'.\n"
+                "drop_oldest: quietly discard the oldest buffered audio.\n"
+                "block: let captions fall behind, waiting up to a second for recognition\n"
+                "to catch up before skipping (also shown as '[skipped N s]').")
+        vad_label = ctk.CTkLabel(audio_frame, text="Skip Silence:")
+        vad_label.grid(row=7, column=0, padx=10, pady=5, sticky="w")
+        self.vad_checkbox = ctk.CTkCheckBox(audio_frame, text="", command=self.update_setting)
+        self.vad_checkbox.grid(row=7, column=1, padx=10, pady=5, sticky="w")
+        adaptive_label = ctk.CTkLabel(audio_frame, text="Auto Block Size:")
+        adaptive_label.grid(row=8, column=0, padx=10, pady=5, sticky="w")
+        self.adaptive_block_checkbox = ctk.CTkCheckBox(audio_frame, text="", command=self.update_setting)
+        self.adaptive_block_checkbox.grid(row=8, column=1, padx=10, pady=5, sticky="w")
+        partial_rate_label = ctk.CTkLabel(audio_frame, text="Partial Updates/s:")
+        partial_rate_label.grid(row=9, column=0, padx=10, pady=5, sticky="w")
+        self.partial_rate_slider = ctk.CTkSlider(audio_frame, from_=1, to=PARTIAL_RATE_NO_LIMIT,
+                                                 number_of_steps=PARTIAL_RATE_NO_LIMIT - 1,
+                                                 command=self.update_setting)
+        self.partial_rate_slider.grid(row=9, column=1, padx=10, pady=5, sticky="ew")
+        self.partial_rate_label = ctk.CTkLabel(audio_frame, text="", width=40)
+        self.partial_rate_label.grid(row=9, column=2, padx=10, pady=5, sticky="w")
+        ToolTip(partial_rate_label,
+                "How often the in-progress line may change. It only changes when\n"
+                "new words were heard; lower values save translation and drawing work.\n"
+                "Slide all the way right for no limit.")
+        ToolTip(adaptive_label,
+                "Adjust the block size while running: smaller blocks for lower latency\n"
+                "when the CPU has headroom, larger ones when recognition falls behind.\n"
+                "The Block Size slider sets the starting point.")
+        ToolTip(vad_label,
+                "Don't send silence and background music to the recognizer.\n"
+                "Saves a lot of CPU when the audio is mostly quiet.")
 
         # --- Translation Section ---
         self.translation_frame = ctk.CTkFrame(scroll_frame)
@@ -542,8 +633,19 @@ class SettingsWindow(ctk.CTkToplevel):
                                                        command=self.on_target_language_change)
         self.target_language_menu.grid(row=3, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
 
+        partial_policy_label = ctk.CTkLabel(self.translation_frame, text="Translate Partials:")
+        partial_policy_label.grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        self.partial_policy_menu = ctk.CTkOptionMenu(self.translation_frame, values=list(PARTIAL_POLICIES),
+                                                     command=self.update_setting)
+        self.partial_policy_menu.grid(row=4, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
+        ToolTip(partial_policy_label,
+                "always: translate every partial result (most CPU).\n"
+                "debounce: at most one partial translation per 'partial_translation_debounce' seconds.\n"
+                "word_delta: only when 'partial_translation_min_words' new words were heard.\n"
+                "finals_only: translate finished sentences only (least CPU).")
+
         self.translation_model_status_label = ctk.CTkLabel(self.translation_frame, text="", text_color="gray")
-        self.translation_model_status_label.grid(row=4, column=0, columnspan=3, pady=5)
+        self.translation_model_status_label.grid(row=5, column=0, columnspan=3, pady=5)
         self.translation_download_progress = ctk.CTkProgressBar(self.translation_frame, orientation="horizontal")
         self.translation_download_progress.set(0)
 
@@ -566,7 +668,18 @@ class SettingsWindow(ctk.CTkToplevel):
         self.save_button = ctk.CTkButton(button_frame, text="Save & Close", command=self.save_and_close)
         self.save_button.pack(side="left", padx=10)
 
+    @property
+    def argos_languages(self):
+        if self._argos_languages is None:
+            self._argos_languages = get_available_argos_languages()
+        return self._argos_languages
+
     def on_backend_change(self, backend):
+        if not self.enable_translation_checkbox.get():
+            # Nothing to list or check until translation is switched on.
+            self.update_setting()
+            return
+
         if backend == "MarianMT":
             self.target_language_menu.configure(values=self.marian_languages)
             if self.target_language_menu.get() not in self.marian_languages:
@@ -600,6 +713,8 @@ class SettingsWindow(ctk.CTkToplevel):
         self.padding_label.configure(text=f"{int(self.padding_slider.get())}")
         self.block_size_label.configure(text=f"{int(self.block_size_slider.get())}")
         self.delay_label.configure(text=f"{self.delay_slider.get():.1f}")
+        partial_rate = round(self.partial_rate_slider.get())
+        self.partial_rate_label.configure(text="Off" if partial_rate >= PARTIAL_RATE_NO_LIMIT else f"{partial_rate}")
 
     def load_settings_to_ui(self):
         self.subtitle_color_btn.configure(fg_color=self.settings['subtitle_color'])
@@ -613,6 +728,14 @@ class SettingsWindow(ctk.CTkToplevel):
         self.language_menu.set(self.settings['language'])
         self.block_size_slider.set(self.settings['block_size'])
         self.delay_slider.set(self.settings['delay_threshold'])
+        self.overload_policy_menu.set(self.settings['audio_overload_policy'])
+        # 0 (no limit) is the slider's last position, past 20.
+        partial_rate = self.settings['partial_max_rate']
+        self.partial_rate_slider.set(min(partial_rate, PARTIAL_RATE_NO_LIMIT - 1) if partial_rate
+                                     else PARTIAL_RATE_NO_LIMIT)
+        self.vad_checkbox.select() if self.settings['vad_enabled'] else self.vad_checkbox.deselect()
+        self.adaptive_block_checkbox.select() if self.settings[
+            'block_size_adaptive'] else self.adaptive_block_checkbox.deselect()
         self.appearance_mode_menu.set(self.settings['appearance_mode'])
         self.show_about_checkbox.select() if self.settings[
             'show_about_on_startup'] else self.show_about_checkbox.deselect()
@@ -620,6 +743,7 @@ class SettingsWindow(ctk.CTkToplevel):
             'translation_enabled'] else self.enable_translation_checkbox.deselect()
         self.backend_menu.set(self.settings['translation_backend'])
         self.target_language_menu.set(self.settings['translation_target_language'])
+        self.partial_policy_menu.set(self.settings['partial_translation_policy'])
 
         self.on_translation_toggle()
         self.on_backend_change(self.settings['translation_backend'])
@@ -650,23 +774,33 @@ class SettingsWindow(ctk.CTkToplevel):
         self.settings['language'] = self.language_menu.get()
         self.settings['block_size'] = int(self.block_size_slider.get())
         self.settings['delay_threshold'] = self.delay_slider.get()
+        self.settings['audio_overload_policy'] = self.overload_policy_menu.get()
+        partial_rate = round(self.partial_rate_slider.get())
+        self.settings['partial_max_rate'] = 0.0 if partial_rate >= PARTIAL_RATE_NO_LIMIT else float(partial_rate)
+        self.settings['vad_enabled'] = bool(self.vad_checkbox.get())
+        self.settings['block_size_adaptive'] = bool(self.adaptive_block_checkbox.get())
         self.settings['model_path'] = self.language_models[self.language_menu.get()]
         self.settings['show_about_on_startup'] = bool(self.show_about_checkbox.get())
         self.settings['appearance_mode'] = self.appearance_mode_menu.get()
         self.settings['translation_enabled'] = bool(self.enable_translation_checkbox.get())
         self.settings['translation_target_language'] = self.target_language_menu.get()
         self.settings['translation_backend'] = self.backend_menu.get()
+        self.settings['partial_translation_policy'] = self.partial_policy_menu.get()
 
         self._update_slider_labels()
         self.caption_window.apply_settings(self.settings)
-
-        if (self.settings['language'] != self.initial_language or
-                self.settings['block_size'] != self.initial_block_size or
-                self.settings['appearance_mode'] != self.initial_appearance_mode):
+        block_size = (self.settings['block_size'], self.settings['block_size_adaptive'])
+        if block_size != self.applied_block_size:
+            # Takes effect on the next recorded block; no restart needed.
+            self.applied_block_size = block_size
+            for block_sizer in block_sizers:
+                block_sizer.configure(*block_size)
+
+        # Language, translation, VAD and policy changes are hot-reloaded; only the theme needs a restart.
+        self.apply_to_pipeline()
+        if self.settings['appearance_mode'] != self.initial_appearance_mode:
             self.show_restart_prompt()
 
-        self.show_restart_prompt()
-
     def on_language_change(self, language):
         self.check_model_status()
         self.update_setting()
@@ -678,6 +812,7 @@ class SettingsWindow(ctk.CTkToplevel):
         self.backend_menu.configure(state=state)
         self.target_language_label.configure(state=state)
         self.target_language_menu.configure(state=state)
+        self.partial_policy_menu.configure(state=state)
 
         if is_enabled:
             self.on_backend_change(self.backend_menu.get())
@@ -693,6 +828,11 @@ class SettingsWindow(ctk.CTkToplevel):
     def show_restart_prompt(self):
         self.restart_frame.grid()
 
+    def apply_to_pipeline(self, force=False):
+        """Hands the settings to the running engine, which loads any new model in the background."""
+        for engine in list(recognition_engines):
+            engine.reload(self.settings, force)
+
     def check_model_status(self):
         selected_lang = self.language_menu.get()
         model_path = self.language_models.get(selected_lang)
@@ -735,7 +875,7 @@ class SettingsWindow(ctk.CTkToplevel):
                 zip_ref.extractall()
             os.remove(zip_path)
             self.model_status_label.configure(text=f"Vosk model '{model_name}' installed.", text_color="green")
-            self.show_restart_prompt()
+            self.apply_to_pipeline(force=True)
         except Exception as e:
             self.model_status_label.configure(text=f"Error downloading Vosk model: {e}", text_color="red")
             if os.path.exists(zip_path):
@@ -754,6 +894,8 @@ class SettingsWindow(ctk.CTkToplevel):
             self.translation_model_status_label.configure(text=message, text_color=color)
 
         translator = get_translator(self.settings, status_callback)
+        # Only loaded to check it; keep it in memory only if a running engine uses it.
+        model_registry.discard_unused(translator.registry_key)
 
         if not translator.is_ready:
             download_thread = threading.Thread(target=self.download_translation_model, daemon=True)
@@ -763,7 +905,7 @@ class SettingsWindow(ctk.CTkToplevel):
         backend = self.backend_menu.get()
         self.target_language_menu.configure(state="disabled")
         self.save_button.configure(state="disabled")
-        self.translation_download_progress.grid(row=5, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
+        self.translation_download_progress.grid(row=6, column=0, columnspan=3, padx=10, pady=5, sticky="ew")
         self.translation_download_progress.configure(mode="indeterminate")
         self.translation_download_progress.start()
 
@@ -772,6 +914,7 @@ class SettingsWindow(ctk.CTkToplevel):
 
         try:
             if backend == "ArgosTranslate":
+                import argostranslate.package
                 self.translation_model_status_label.configure(
                     text=f"Downloading Argos model for {from_lang_name} -> {to_lang_name}...")
                 argostranslate.package.update_package_index()
@@ -787,6 +930,7 @@ class SettingsWindow(ctk.CTkToplevel):
                 self.translation_model_status_label.configure(text=f"Argos model installed.", text_color="green")
 
             elif backend == "MarianMT":
+                from transformers import MarianMTModel, MarianTokenizer
                 model_name = f'Helsinki-NLP/opus-mt-{MarianTranslator.LANG_CODE_MAP[from_lang_name]}-{MarianTranslator.LANG_CODE_MAP[to_lang_name]}'
                 self.translation_model_status_label.configure(text=f"Downloading MarianMT model: {model_name}...")
                 MarianTokenizer.from_pretrained(model_name)
@@ -803,7 +947,7 @@ class SettingsWindow(ctk.CTkToplevel):
             self.translation_download_progress.grid_forget()
             self.target_language_menu.configure(state="normal")
             self.save_button.configure(state="normal")
-            self.show_restart_prompt()
+            self.apply_to_pipeline(force=True)
 
     def reset_defaults(self):
         if messagebox.askyesno("Reset Settings",
@@ -836,9 +980,15 @@ class CaptionWindow:
 
         self.max_lines = 2
         self.caption_history = collections.deque(maxlen=self.max_lines * 2)
-        self.current_partial_text = ""
-        self.text_wrap_width = 70
+        # Partial caption per audio source; None is the untagged single-source stream.
+        self.current_partials = {}
+        self._last_source = None
+        self.layout = None
         self.is_paused = False
+        self._rendered_key = None
+        self._display_text = None
+        self._clear_job = None
+        self._wakeup = threading.Event()
 
         self.main_frame = tk.Frame(root)
         self.main_frame.pack(expand=True, fill='both')
@@ -856,6 +1006,7 @@ class CaptionWindow:
         self.settings_menu = tk.Menu(root, tearoff=0)
         self.settings_menu.add_command(label="Settings", command=self.open_settings_window)
         self.settings_menu.add_command(label="About", command=self.open_about_window)
+        self.settings_menu.add_command(label="Latency Stats", command=self.show_latency_stats)
         self.settings_menu.add_command(label="Restart", command=self.restart_app)
         self.settings_menu.add_separator()
         self.settings_menu.add_command(label="Exit", command=self.quit_app)
@@ -864,7 +1015,13 @@ class CaptionWindow:
         self.caption_label.bind("<Button-3>", self.show_settings_menu)
         self.main_frame.bind("<Button-3>", self.show_settings_menu)
 
+        self.root.bind("<<CaptionsAvailable>>", self.on_captions_available)
+        threading.Thread(target=self._wake_tk_loop, daemon=True).start()
+
         self.apply_settings(self.settings)
+
+        global caption_notifier
+        caption_notifier = self.notify_new_captions
         self.update_caption()
 
     def apply_settings(self, settings):
@@ -877,31 +1034,29 @@ class CaptionWindow:
         self.root.geometry(f"{settings['window_width']}x{settings['window_height']}")
         self.main_frame.pack_configure(padx=settings['window_padding'], pady=10)
 
+        effective_width = settings['window_width'] - (2 * settings['window_padding']) - 10
         try:
-            font_obj = tkfont.Font(family=settings['subtitle_font'], size=settings['subtitle_size'])
+            # Measure with the same bold font the label draws with.
+            font_obj = tkfont.Font(family=settings['subtitle_font'], size=settings['subtitle_size'], weight="bold")
             line_height = font_obj.metrics('linespace')
             if line_height > 0:
                 available_height = settings['window_height'] - 20
                 self.max_lines = max(1, available_height // line_height)
-                self.caption_history = collections.deque(maxlen=self.max_lines * 2)
-
-            sample_text = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789"
-            avg_char_width = font_obj.measure(sample_text) / len(sample_text)
-
-            if avg_char_width > 0:
-                effective_width = settings['window_width'] - (2 * settings['window_padding']) - 10
-                self.text_wrap_width = max(20, int(effective_width / avg_char_width))
-            else:
-                effective_width = settings['window_width'] - (2 * settings['window_padding'])
-                estimated_char_width = settings['subtitle_size'] * 0.6
-                self.text_wrap_width = max(20, int(effective_width / estimated_char_width))
-
+            measure = font_obj.measure
         except tk.TclError:
-            effective_width = settings['window_width'] - (2 * settings['window_padding'])
             estimated_char_width = settings['subtitle_size'] * 0.6
-            self.text_wrap_width = max(20, int(effective_width / estimated_char_width))
+            measure = lambda text: int(len(text) * estimated_char_width)
             self.max_lines = 2
 
+        self.caption_history = collections.deque(self.caption_history, maxlen=self.max_lines * 2)
+        self.layout = CaptionLayout(measure, effective_width, self.max_lines)
+        for text, new_line in self.caption_history:
+            self.layout.add_final(text, new_line)
+
+        # Wrap width or line count may have changed; force a redraw.
+        self._rendered_key = None
+        self.render_captions()
+
     def open_settings_window(self):
         if not any(isinstance(x, SettingsWindow) for x in self.root.winfo_children()):
             SettingsWindow(self.root, self.settings_manager, self, self.restart_callback)
@@ -931,41 +1086,97 @@ class CaptionWindow:
         y = self.root.winfo_y() + deltay
         self.root.geometry(f"+{x}+{y}")
 
+    def notify_new_captions(self):
+        """Asks for newly queued captions to be displayed. Safe to call from any thread; never blocks."""
+        self._wakeup.set()
+
+    def _wake_tk_loop(self):
+        # event_generate from another thread waits until the Tk thread has handled it, so it
+        # happens here rather than on the recognizer and translation threads. Wakeups requested
+        # meanwhile are coalesced into the next one.
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.root.event_generate("<<CaptionsAvailable>>", when="tail")
+            except (tk.TclError, RuntimeError):
+                # The window is being destroyed.
+                return
+
+    def on_captions_available(self, event=None):
+        self.update_caption()
+
     def update_caption(self):
-        global last_caption_time
-        new_content_available = not caption_queue.empty()
-        if new_content_available: self.is_paused = False
+        """Moves queued captions into the history and redraws if anything arrived."""
+        arrived = []
         try:
-            while not caption_queue.empty():
+            while True:
                 new_text = caption_queue.get_nowait()
+                arrived.append(new_text)
+                source = getattr(new_text, 'source', None)
                 if new_text.startswith("..."):
-                    self.current_partial_text = new_text[4:]
+                    self.current_partials[source] = new_text[4:]
+                    continue
+                if source is None:
+                    entry = (new_text, False)
                 else:
-                    self.caption_history.append(new_text)
-                    self.current_partial_text = ""
+                    # With several sources, a new speaker starts a tagged line; the same one flows on.
+                    entry = (f"{source}: {new_text}", True) if source != self._last_source else (new_text, False)
+                    self._last_source = source
+                self.caption_history.append(entry)
+                self.layout.add_final(*entry)
+                self.current_partials.pop(source, None)
         except queue.Empty:
             pass
-        if not new_content_available and (time.time() - last_caption_time) > self.settings[
-            'delay_threshold'] and not self.is_paused:
+        if arrived:
+            self.is_paused = False
+            self.schedule_clear()
+            self.render_captions()
+            displayed_at = time.monotonic()
+            for caption in arrived:
+                if getattr(caption, 'queued_at', None) is not None:
+                    caption.displayed_at = displayed_at
+                    latency_tracker.record_caption(caption, ("display", "end_to_end"))
+
+    def schedule_clear(self):
+        """Arranges for the captions to be cleared once the pause delay passes without new captions."""
+        if self._clear_job:
+            self.root.after_cancel(self._clear_job)
+        remaining = self.settings['delay_threshold'] - (time.time() - last_caption_time)
+        self._clear_job = self.root.after(max(0, int(remaining * 1000)) + 50, self.clear_if_idle)
+
+    def clear_if_idle(self):
+        self._clear_job = None
+        if (time.time() - last_caption_time) <= self.settings['delay_threshold']:
+            self.schedule_clear()
+        elif not self.is_paused:
             self.caption_history.clear()
-            self.current_partial_text = ""
+            self.layout.clear()
+            self.current_partials.clear()
+            self._last_source = None
             self.is_paused = True
+            self.render_captions()
+
+    def render_captions(self):
+        """Lays the captions out into the label, skipping all work if nothing has changed."""
+        partial = self.current_partials.get(None, "")
+        tagged = tuple(f"{source}: {text}" for source, text in self.current_partials.items() if source and text)
+        rendered_key = (self.layout.version, partial, tagged)
+        if rendered_key == self._rendered_key:
+            return
+        self._rendered_key = rendered_key
 
-        full_text = " ".join(filter(None, self.caption_history))
-        if self.current_partial_text:
-            if full_text: full_text += " "
-            full_text += self.current_partial_text
-
-        wrapped_lines = textwrap.wrap(full_text, width=self.text_wrap_width, break_long_words=True,
-                                      break_on_hyphens=False)
-        display_lines = wrapped_lines[-self.max_lines:] if len(wrapped_lines) > self.max_lines else wrapped_lines
-        display_text = "\n".join(display_lines)
+        display_text = "\n".join(self.layout.render(partial, tagged))
 
         if not display_text.strip():
             display_text = "Listening for audio... (Right-click for settings)"
 
-        self.caption_label.config(text=display_text)
-        self.root.after(100, self.update_caption)
+        if display_text != self._display_text:
+            self._display_text = display_text
+            self.caption_label.config(text=display_text)
+
+    def show_latency_stats(self):
+        messagebox.showinfo("Latency Stats", latency_tracker.format_summary(), parent=self.root)
 
     def restart_app(self):
         self.restart_callback()
@@ -976,68 +1187,54 @@ class CaptionWindow:
 
 
 # --- Background Threads ---
-def audio_capture_thread(block_size, sample_rate):
-    """Captures audio from the default speaker and puts it into a queue."""
+def open_capture_device(source):
+    """Returns the soundcard microphone for an 'audio_sources' entry."""
+    device = source.get('device', 'default')
+    loopback = source.get('loopback', True)
+    if device == 'default':
+        if loopback:
+            default_speaker = sc.default_speaker()
+            return sc.get_microphone(id=str(default_speaker.id), include_loopback=True)
+        return sc.default_microphone()
+    # soundcard accepts a device id or any part of its name.
+    return sc.get_microphone(id=device, include_loopback=loopback)
+
+
+def audio_capture_thread(block_size, sample_rate, source=DEFAULT_AUDIO_SOURCE, buffer=None, block_sizer=None):
+    """Captures audio from a source (by default the speaker loopback) and puts it into a queue."""
+    buffer = audio_queue if buffer is None else buffer
+    block_sizer = BlockSizeController(block_size) if block_sizer is None else block_sizer
     try:
-        default_speaker = sc.default_speaker()
-        print(f"Using speaker: {default_speaker.name} for audio capture.")
-        with sc.get_microphone(id=str(default_speaker.id), include_loopback=True).recorder(
-                samplerate=sample_rate, channels=1, blocksize=int(block_size)
-        ) as mic:
+        device = open_capture_device(source)
+        print(f"Using {'loopback of ' if source.get('loopback', True) else ''}{device.name} for audio capture.")
+        with device.recorder(samplerate=sample_rate, channels=1, blocksize=int(block_size)) as mic:
             print("Audio recorder started.")
+            # Sized for the largest block, since block_sizer can change the size between reads.
+            ring = PcmRing.for_buffer(buffer, block_sizer.maximum)
             while not stop_threads.is_set():
-                data = mic.record(numframes=int(block_size))
-                data_int16 = (data * 32767).astype(np.int16)
-                audio_queue.put(data_int16.tobytes())
+                data = mic.record(numframes=block_sizer.block_size)
+                buffer.put(ring.convert(data))
     except Exception as e:
         print(f"Error in audio capture: {e}", file=sys.stderr)
-        caption_queue.put("ERROR: Could not capture audio. Check audio devices.")
+        caption_broadcaster.put("ERROR: Could not capture audio. Check audio devices.")
+        notify_caption_window()
 
 
-def speech_recognition_thread(settings, sample_rate):
+def speech_recognition_thread(settings, sample_rate, buffer=None, source_name=None, block_sizer=None):
     """Processes audio from the queue using Vosk and optionally translates it."""
-    global last_caption_time
-    model_path = settings['model_path']
-    try:
-        if not os.path.isdir(model_path):
-            raise FileNotFoundError(f"Model path '{model_path}' not found. Please select a valid model in settings.")
-        model = vosk.Model(model_path)
-        recognizer = vosk.KaldiRecognizer(model, sample_rate)
-        recognizer.SetWords(True)
-        print("Vosk model loaded. Speech recognition thread started.")
-    except Exception as e:
-        print(f"Error loading Vosk model: {e}", file=sys.stderr)
-        caption_queue.put(f"ERROR: Failed to load Vosk model. Please check settings.")
-        return
 
-    translator = get_translator(settings)
-    if translator:
-        print(f"Translation enabled with backend: {settings.get('translation_backend')}")
-    else:
-        print("Translation disabled.")
+    def on_caption(text):
+        global last_caption_time
+        last_caption_time = time.time()
+        notify_caption_window()
 
-    while not stop_threads.is_set():
-        try:
-            audio_data = audio_queue.get(timeout=1)
-            if recognizer.AcceptWaveform(audio_data):
-                result_dict = json.loads(recognizer.Result())
-                text = result_dict.get('text', '')
-                if text:
-                    if translator and translator.is_ready:
-                        text = translator.translate(text)
-                    caption_queue.put(text)
-                    last_caption_time = time.time()
-            else:
-                partial_result_dict = json.loads(recognizer.PartialResult())
-                partial_text = partial_result_dict.get('partial', '')
-                if partial_text:
-                    # **MODIFIED**: Translate partial text for real-time effect
-                    if translator and translator.is_ready:
-                        partial_text = translator.translate(partial_text)
-                    caption_queue.put(f"... {partial_text}")
-                    last_caption_time = time.time()
-        except queue.Empty:
-            continue
+    engine = TranscriptionEngine(settings, sample_rate, audio_queue=audio_queue if buffer is None else buffer,
+                                 caption_queue=caption_broadcaster, stop_event=stop_threads, on_caption=on_caption,
+                                 block_sizer=block_sizer, source=source_name)
+    if metrics_server:
+        metrics_server.attach(engine)
+    recognition_engines.append(engine)
+    engine.run()
 
 
 def main():
@@ -1062,6 +1259,11 @@ def main():
     def restart_application():
         print("Restarting application...")
         stop_threads.set()
+        # Free the ports for the new process.
+        if metrics_server:
+            metrics_server.stop()
+        if sse_server:
+            sse_server.stop()
         time.sleep(0.5)
         root.destroy()
 
@@ -1079,15 +1281,40 @@ def main():
                 messagebox.showerror("Restart Failed",
                                      "Failed to restart the application automatically. Please restart it manually.")
 
+    global audio_queue, metrics_server, sse_server
     stop_threads.clear()
     SAMPLE_RATE = 16000
-
-    audio_thread = threading.Thread(target=audio_capture_thread, args=(settings['block_size'], SAMPLE_RATE),
-                                    daemon=True)
-    audio_thread.start()
-
-    recognizer_thread = threading.Thread(target=speech_recognition_thread, args=(settings, SAMPLE_RATE), daemon=True)
-    recognizer_thread.start()
+    audio_queue = AudioBuffer.from_settings(settings, SAMPLE_RATE)
+    if settings.get('preload_models', True):
+        model_registry.warm(settings)
+    metrics_server = MetricsServer.from_settings(settings)
+    if metrics_server and not metrics_server.start():
+        metrics_server = None
+    sse_server = SSEServer.from_settings(caption_broadcaster, settings)
+    if sse_server and not sse_server.start():
+        sse_server = None
+    if settings.get('caption_log_path'):
+        CaptionLogSink(caption_broadcaster, settings['caption_log_path'], stop_threads)
+    try:
+        subtitle_writer = SubtitleWriter.from_settings(settings)
+        if subtitle_writer:
+            subtitle_writer.attach(caption_broadcaster, stop_threads)
+    except ValueError as e:
+        print(f"Subtitle export disabled: {e}", file=sys.stderr)
+
+    # One capture thread and one recognizer thread per source; the Vosk model itself is shared.
+    sources = settings.get('audio_sources') or [DEFAULT_AUDIO_SOURCE]
+    for index, source in enumerate(sources):
+        buffer = audio_queue if index == 0 else AudioBuffer.from_settings(settings, SAMPLE_RATE)
+        # A single source keeps the untagged display.
+        name = (source.get('name') or source.get('device') or f"Source {index + 1}") if len(sources) > 1 else None
+        # Each source sizes its own blocks from its own recognizer's load.
+        block_sizer = BlockSizeController.from_settings(settings)
+        block_sizers.append(block_sizer)
+        threading.Thread(target=audio_capture_thread,
+                         args=(settings['block_size'], SAMPLE_RATE, source, buffer, block_sizer), daemon=True).start()
+        threading.Thread(target=speech_recognition_thread, args=(settings, SAMPLE_RATE, buffer, name, block_sizer),
+                         daemon=True).start()
 
     app = CaptionWindow(root, settings_manager, restart_application)
 
@@ -1104,6 +1331,10 @@ def main():
         root.mainloop()
     finally:
         stop_threads.set()
+        if metrics_server:
+            metrics_server.stop()
+        if sse_server:
+            sse_server.stop()
 
 
 if __name__ == "__main__":
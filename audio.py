@@ -0,0 +1,305 @@
+"""Audio buffering between the capture thread and the recognizer."""
+import collections
+import queue
+import threading
+import time
+
+import numpy as np
+
+# --- Constants ---
+OVERLOAD_POLICIES = ("drop_oldest", "skip_to_live", "block")
+DEFAULT_MAX_BLOCKS = 32
+
+
+class AudioBuffer:
+    """
+    A bounded queue of PCM blocks with a policy for when the recognizer falls behind.
+
+    "drop_oldest" discards the oldest queued block to make room, "skip_to_live"
+    discards everything queued so recognition jumps back to live audio, and
+    "block" makes the capture thread wait, up to the put() timeout, since a live
+    capture device cannot be paused for long without losing audio itself.
+    Dropped audio is counted so the recognizer can show a "[skipped N s]"
+    marker and metrics can report it. The skipped time is attached to the
+    block queued after the gap, so it is reported when the recognizer reaches
+    that point in the audio rather than when the drop happened.
+    """
+
+    def __init__(self, max_blocks=DEFAULT_MAX_BLOCKS, policy="skip_to_live", sample_rate=16000):
+        self.max_blocks = max(1, int(max_blocks))
+        self.policy = policy if policy in OVERLOAD_POLICIES else "skip_to_live"
+        self.sample_rate = sample_rate
+        self.dropped_blocks = 0
+        self.dropped_seconds = 0.0
+        # Dropped since the last block was queued; attached to the next one.
+        self._gap_seconds = 0.0
+        # Gaps in front of blocks already handed to the recognizer.
+        self._unreported_seconds = 0.0
+        # Entries are [captured_at, block, seconds skipped just before it].
+        self._blocks = collections.deque()
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_settings(cls, settings, sample_rate=16000):
+        return cls(settings.get('audio_queue_max_blocks', DEFAULT_MAX_BLOCKS),
+                   settings.get('audio_overload_policy', "skip_to_live"), sample_rate)
+
+    def _seconds(self, block):
+        return len(block) / 2 / self.sample_rate
+
+    def _drop(self, block):
+        seconds = self._seconds(block)
+        self.dropped_blocks += 1
+        self.dropped_seconds += seconds
+        self._gap_seconds += seconds
+
+    def _drop_oldest(self):
+        _, block, gap = self._blocks.popleft()
+        self._gap_seconds += gap
+        self._drop(block)
+        if self._blocks:
+            # The gap now ends in front of the new oldest block.
+            self._blocks[0][2] += self._gap_seconds
+            self._gap_seconds = 0.0
+
+    def put(self, block, timeout=1.0, captured_at=None):
+        """
+        Adds a block of 16-bit PCM, applying the overload policy if the buffer is full.
+        Under "block", a block that still does not fit after `timeout` seconds is dropped.
+        `captured_at` is the time.monotonic() at which the block was recorded (default: now).
+        """
+        with self._condition:
+            if len(self._blocks) >= self.max_blocks:
+                if self.policy == "block":
+                    if not self._condition.wait_for(lambda: len(self._blocks) < self.max_blocks, timeout):
+                        self._drop(block)
+                        return
+                elif self.policy == "skip_to_live":
+                    while self._blocks:
+                        self._drop_oldest()
+                else:
+                    self._drop_oldest()
+            self._blocks.append([time.monotonic() if captured_at is None else captured_at, block, self._gap_seconds])
+            self._gap_seconds = 0.0
+            self._condition.notify_all()
+
+    def get_timed(self, timeout=None):
+        """Removes the oldest block and returns (captured_at, block). Raises queue.Empty after `timeout` seconds."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._blocks, timeout):
+                raise queue.Empty
+            captured_at, block, gap = self._blocks.popleft()
+            self._unreported_seconds += gap
+            self._condition.notify_all()
+            return captured_at, block
+
+    def get(self, timeout=None):
+        """Removes and returns the oldest block. Raises queue.Empty after `timeout` seconds."""
+        return self.get_timed(timeout)[1]
+
+    def take_skipped_seconds(self):
+        """Returns the audio dropped in front of the blocks taken since the last call, for showing a skip marker."""
+        with self._condition:
+            seconds, self._unreported_seconds = self._unreported_seconds, 0.0
+            return seconds
+
+    def qsize(self):
+        with self._condition:
+            return len(self._blocks)
+
+    def clear(self):
+        with self._condition:
+            self._blocks.clear()
+            self._condition.notify_all()
+
+
+class BlockSizeController:
+    """
+    Chooses how many samples the capture thread records per block.
+
+    With `adaptive` off this simply holds the configured size, which can be
+    changed while running. With it on, the recognizer reports how long each
+    block took; once `interval` seconds of audio have passed since the last
+    change, the size grows by `step` if recognition is falling behind (load
+    above `high_load` or blocks queueing up) and shrinks by `step` for lower
+    latency when there is headroom (load below `low_load`, empty queue).
+    Load is recognizer time divided by audio time, smoothed over recent blocks.
+    """
+
+    def __init__(self, block_size=3000, adaptive=False, minimum=1000, maximum=8000, step=500,
+                 low_load=0.3, high_load=0.7, interval=2.0):
+        self.minimum = int(minimum)
+        self.maximum = max(int(maximum), self.minimum)
+        self.step = int(step)
+        self.low_load = low_load
+        self.high_load = high_load
+        self.interval = interval
+        self.load = None
+        self._audio_since_change = 0.0
+        self.configure(block_size, adaptive)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('block_size', 3000), settings.get('block_size_adaptive', False),
+                   settings.get('block_size_min', 1000), settings.get('block_size_max', 8000))
+
+    def configure(self, block_size, adaptive):
+        """Sets the block size (and whether to adapt from it) while capture is running."""
+        self.block_size = min(self.maximum, max(self.minimum, int(block_size)))
+        self.adaptive = bool(adaptive)
+        self._audio_since_change = 0.0
+
+    def observe(self, processing_seconds, audio_seconds, queue_depth):
+        """Records how long the recognizer took for one block. Returns the new block size if it changed."""
+        if not self.adaptive or audio_seconds <= 0:
+            return None
+        load = processing_seconds / audio_seconds
+        self.load = load if self.load is None else 0.8 * self.load + 0.2 * load
+        self._audio_since_change += audio_seconds
+        if self._audio_since_change < self.interval:
+            return None
+
+        size = self.block_size
+        if queue_depth > 1 or self.load > self.high_load:
+            size = min(self.maximum, size + self.step)
+        elif queue_depth == 0 and self.load < self.low_load:
+            size = max(self.minimum, size - self.step)
+        if size == self.block_size:
+            return None
+        self.block_size = size
+        self._audio_since_change = 0.0
+        return size
+
+
+class PcmRing:
+    """
+    Preallocated 16-bit PCM storage for converting recorder blocks without allocating.
+
+    Each call to convert() clips the float samples to [-1, 1], scales them into
+    the next slot of the ring in place and returns a memoryview of that slot.
+    A slot is reused after `slots` further blocks, so `slots` must exceed the
+    number of blocks that can be queued or in use by the recognizer at once.
+    """
+
+    def __init__(self, slots, block_size):
+        self.block_size = int(block_size)
+        self._buffers = [bytearray(self.block_size * 2) for _ in range(max(2, int(slots)))]
+        self._arrays = [np.frombuffer(buf, dtype=np.int16) for buf in self._buffers]
+        self._views = [memoryview(buf) for buf in self._buffers]
+        self._scratch = np.empty(self.block_size, dtype=np.float32)
+        self._index = 0
+
+    @classmethod
+    def for_buffer(cls, audio_buffer, block_size):
+        # Every queued block, plus one being recognized and one being recorded.
+        return cls(audio_buffer.max_blocks + 2, block_size)
+
+    def convert(self, data):
+        """Converts float samples in [-1, 1] to 16-bit PCM. Returns a memoryview into the ring."""
+        samples = data.reshape(-1)
+        n = min(len(samples), self.block_size)
+        scratch = self._scratch[:n]
+        # Clip first: values above 1.0 would otherwise wrap around to large negative samples.
+        np.clip(samples[:n], -1.0, 1.0, out=scratch)
+        np.multiply(scratch, 32767, out=scratch)
+        np.copyto(self._arrays[self._index][:n], scratch, casting='unsafe')
+        view = self._views[self._index][:n * 2]
+        self._index = (self._index + 1) % len(self._buffers)
+        return view
+
+
+class VoiceActivityGate:
+    """
+    Skips silent stretches before they reach the recognizer.
+
+    A block counts as speech when its level is above `threshold_db` dBFS and,
+    with `spectral` on, most of its energy lies in the speech band. After
+    speech, `hangover` seconds of quiet are still passed through so Vosk can
+    end the utterance naturally; the last `preroll` seconds of skipped audio
+    are kept and replayed at the next onset so first syllables are not lost.
+    """
+    SPEECH_BAND_HZ = (250.0, 4000.0)
+    SPEECH_BAND_RATIO = 0.5
+
+    def __init__(self, sample_rate=16000, threshold_db=-50.0, hangover=0.6, preroll=0.3, spectral=True):
+        self.sample_rate = sample_rate
+        self.threshold_db = float(threshold_db)
+        self.hangover = float(hangover)
+        self.preroll = float(preroll)
+        self.spectral = spectral
+        self.active = False
+        self.utterance_ended = False
+        self.skipped_seconds = 0.0
+        self._hangover_left = 0.0
+        self._preroll_buffer = bytearray(int(self.preroll * sample_rate) * 2)
+        self._preroll_view = memoryview(self._preroll_buffer)
+        self._preroll_pos = 0
+        self._preroll_filled = 0
+
+    @classmethod
+    def from_settings(cls, settings, sample_rate=16000):
+        return cls(sample_rate, settings.get('vad_threshold_db', -50.0), settings.get('vad_hangover', 0.6),
+                   settings.get('vad_preroll', 0.3), settings.get('vad_spectral', True))
+
+    def is_speech(self, block):
+        samples = np.frombuffer(block, dtype=np.int16)
+        if len(samples) == 0:
+            return False
+        power = np.dot(samples.astype(np.float32), samples.astype(np.float32)) / len(samples)
+        level_db = 10.0 * np.log10(max(power, 1e-10) / (32768.0 * 32768.0))
+        if level_db < self.threshold_db:
+            return False
+        if not self.spectral:
+            return True
+        spectrum = np.abs(np.fft.rfft(samples)) ** 2
+        freqs = np.fft.rfftfreq(len(samples), 1.0 / self.sample_rate)
+        low, high = self.SPEECH_BAND_HZ
+        band = spectrum[(freqs >= low) & (freqs <= high)].sum()
+        return band >= self.SPEECH_BAND_RATIO * max(spectrum.sum(), 1e-10)
+
+    def process(self, block):
+        """
+        Returns the blocks to feed to the recognizer for this block: none during
+        silence, or the pre-roll followed by the block at speech onset. Sets
+        `utterance_ended` when the hangover runs out.
+        """
+        self.utterance_ended = False
+        seconds = len(block) / 2 / self.sample_rate
+        if self.is_speech(block):
+            blocks = [] if self.active else self._take_preroll()
+            self.active = True
+            self._hangover_left = self.hangover
+            blocks.append(block)
+            return blocks
+        if self.active and self._hangover_left > 0:
+            self._hangover_left -= seconds
+            return [block]
+        if self.active:
+            self.active = False
+            self.utterance_ended = True
+        self.skipped_seconds += seconds
+        self._keep_preroll(block)
+        return []
+
+    def _keep_preroll(self, block):
+        # Copies into the preallocated circular buffer; only the newest `preroll` seconds survive.
+        capacity = len(self._preroll_buffer)
+        if capacity == 0:
+            return
+        data = memoryview(block).cast('B')[-capacity:]
+        first = min(len(data), capacity - self._preroll_pos)
+        self._preroll_view[self._preroll_pos:self._preroll_pos + first] = data[:first]
+        self._preroll_view[:len(data) - first] = data[first:]
+        self._preroll_pos = (self._preroll_pos + len(data)) % capacity
+        self._preroll_filled = min(capacity, self._preroll_filled + len(data))
+
+    def _take_preroll(self):
+        filled, self._preroll_filled = self._preroll_filled, 0
+        if filled == 0:
+            return []
+        # Replayed audio is no longer skipped.
+        self.skipped_seconds -= filled / 2 / self.sample_rate
+        start = (self._preroll_pos - filled) % len(self._preroll_buffer)
+        if start + filled <= len(self._preroll_buffer):
+            return [self._preroll_view[start:start + filled]]
+        return [self._preroll_view[start:], self._preroll_view[:self._preroll_pos]]
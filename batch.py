@@ -0,0 +1,227 @@
+"""Faster-than-realtime batch transcription of recorded audio.
+
+Long recordings are cut into segments at silence boundaries and the segments
+are transcribed in parallel, one Vosk model per worker process. Results are
+stitched back together in order with timestamps relative to the whole file.
+
+    python -m batch archive.wav --workers 8 --format jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import vosk
+
+from engine import SAMPLE_RATE, DEFAULT_BLOCK_SIZE, DEFAULT_MODEL_PATH, fast_json_loads, load_settings_file
+
+# --- Constants ---
+FRAME_SECONDS = 0.03
+SCAN_CHUNK_SECONDS = 60
+DEFAULT_SEGMENT_SECONDS = 30.0
+DEFAULT_SILENCE_DB = -40.0
+
+# --- Per-worker state ---
+_worker_model = None
+
+
+class AudioFile:
+    """Random access to the samples of a 16-bit mono WAV or raw PCM file."""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.data_offset = 0
+        with open(path, 'rb') as f:
+            is_wav = f.read(4) == b"RIFF"
+        if is_wav:
+            with wave.open(path, 'rb') as wav:
+                if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                    raise ValueError(f"'{path}' must be 16-bit mono PCM.")
+                self.sample_rate = wav.getframerate()
+                self.num_samples = wav.getnframes()
+            self.data_offset = _wav_data_offset(path)
+        else:
+            self.num_samples = os.path.getsize(path) // 2
+
+    @property
+    def duration(self):
+        return self.num_samples / self.sample_rate
+
+    def read(self, start, count):
+        """Returns `count` samples starting at sample `start` as bytes."""
+        with open(self.path, 'rb') as f:
+            f.seek(self.data_offset + start * 2)
+            return f.read(count * 2)
+
+
+def _wav_data_offset(path):
+    """Returns the file offset of the first sample in a WAV file's data chunk."""
+    with open(path, 'rb') as f:
+        f.seek(12)
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"'{path}' has no data chunk.")
+            size = int.from_bytes(header[4:], 'little')
+            if header[:4] == b"data":
+                return f.tell()
+            f.seek(size + (size & 1), 1)
+
+
+def frame_energies(audio, frame_seconds=FRAME_SECONDS):
+    """Returns the RMS level in dBFS of each fixed-size frame of the file."""
+    frame_len = max(1, int(audio.sample_rate * frame_seconds))
+    chunk_frames = max(1, int(SCAN_CHUNK_SECONDS / frame_seconds))
+    levels = []
+    for start in range(0, audio.num_samples, frame_len * chunk_frames):
+        count = min(frame_len * chunk_frames, audio.num_samples - start)
+        samples = np.frombuffer(audio.read(start, count), dtype=np.int16)
+        usable = (len(samples) // frame_len) * frame_len
+        if usable == 0:
+            break
+        frames = samples[:usable].astype(np.float32).reshape(-1, frame_len)
+        rms = np.sqrt(np.mean(frames * frames, axis=1)) / 32768.0
+        levels.append(20.0 * np.log10(np.maximum(rms, 1e-10)))
+    if not levels:
+        return np.zeros(0, dtype=np.float32), frame_len
+    return np.concatenate(levels), frame_len
+
+
+def split_at_silence(levels, frame_len, num_samples, sample_rate, segment_seconds=DEFAULT_SEGMENT_SECONDS,
+                     silence_db=DEFAULT_SILENCE_DB):
+    """
+    Chooses cut points near every `segment_seconds`, preferring silent frames.
+    Returns a list of (start_sample, end_sample) pairs covering the whole file.
+    """
+    target = max(1, int(segment_seconds * sample_rate / frame_len))
+    window = max(1, target // 2)
+    silent = levels < silence_db
+    cuts = [0]
+    pos = 0
+    while len(levels) - pos > target + window:
+        lo, hi = pos + target - window, pos + target + window
+        candidates = np.flatnonzero(silent[lo:hi])
+        if len(candidates):
+            cut = lo + candidates[np.argmin(np.abs(candidates + lo - (pos + target)))]
+        else:
+            cut = lo + int(np.argmin(levels[lo:hi]))
+        cuts.append(cut)
+        pos = cut
+    boundaries = [c * frame_len for c in cuts] + [num_samples]
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def _init_worker(model_path):
+    """Loads the Vosk model once per worker process."""
+    global _worker_model
+    vosk.SetLogLevel(-1)
+    _worker_model = vosk.Model(model_path)
+
+
+def _result_to_segment(result, offset):
+    words = [dict(w, start=w['start'] + offset, end=w['end'] + offset) for w in result.get('result', [])]
+    segment = {'text': result.get('text', ''), 'words': words}
+    if words:
+        segment['start'] = words[0]['start']
+        segment['end'] = words[-1]['end']
+    return segment
+
+
+def transcribe_segment(path, sample_rate, data_offset, start, end, block_size=DEFAULT_BLOCK_SIZE):
+    """Transcribes samples [start, end) of a file in a worker. Timestamps are relative to the whole file."""
+    recognizer = vosk.KaldiRecognizer(_worker_model, sample_rate)
+    recognizer.SetWords(True)
+    offset = start / sample_rate
+    results = []
+    with open(path, 'rb') as f:
+        f.seek(data_offset + start * 2)
+        remaining = end - start
+        while remaining > 0:
+            count = min(int(block_size), remaining)
+            audio_data = f.read(count * 2)
+            if not audio_data:
+                break
+            remaining -= count
+            if recognizer.AcceptWaveform(audio_data):
+                results.append(fast_json_loads(recognizer.Result()))
+    results.append(fast_json_loads(recognizer.FinalResult()))
+    return [_result_to_segment(r, offset) for r in results if r.get('text')]
+
+
+def transcribe_file(path, model_path=DEFAULT_MODEL_PATH, workers=None, sample_rate=SAMPLE_RATE,
+                    segment_seconds=DEFAULT_SEGMENT_SECONDS, silence_db=DEFAULT_SILENCE_DB,
+                    block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Transcribes a whole file across a process pool.
+    Yields result dicts (text, start, end, words) in order as segments complete.
+    """
+    if not os.path.isdir(model_path):
+        raise FileNotFoundError(f"Model path '{model_path}' not found.")
+    audio = AudioFile(path, sample_rate)
+    levels, frame_len = frame_energies(audio)
+    segments = split_at_silence(levels, frame_len, audio.num_samples, audio.sample_rate, segment_seconds,
+                                silence_db)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path,)) as pool:
+        futures = [pool.submit(transcribe_segment, audio.path, audio.sample_rate, audio.data_offset, start, end,
+                               block_size)
+                   for start, end in segments]
+        for future in futures:
+            for result in future.result():
+                yield result
+
+
+def format_timestamp(seconds):
+    hours, rem = divmod(seconds, 3600)
+    minutes, secs = divmod(rem, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m batch",
+                                     description="Transcribe a recorded file faster than realtime using all cores.")
+    parser.add_argument("input", help="WAV file or raw 16-bit mono PCM file")
+    parser.add_argument("--settings", default="settings.json", help="settings file to read (default: settings.json)")
+    parser.add_argument("--model", help="Vosk model directory (overrides settings)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="sample rate of raw PCM input")
+    parser.add_argument("--segment-seconds", type=float, default=DEFAULT_SEGMENT_SECONDS,
+                        help="approximate length of each parallel segment")
+    parser.add_argument("--silence-db", type=float, default=DEFAULT_SILENCE_DB,
+                        help="level below which a frame counts as silence when choosing cut points")
+    parser.add_argument("--format", choices=["text", "jsonl"], default="text", help="output format")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    settings = load_settings_file(args.settings)
+    model_path = args.model or settings.get('model_path', DEFAULT_MODEL_PATH)
+
+    started = time.time()
+    try:
+        audio = AudioFile(args.input, args.sample_rate)
+        for result in transcribe_file(args.input, model_path, args.workers, args.sample_rate, args.segment_seconds,
+                                      args.silence_db, settings.get('block_size', DEFAULT_BLOCK_SIZE)):
+            if args.format == "jsonl":
+                print(json.dumps(result), flush=True)
+            else:
+                print(f"[{format_timestamp(result.get('start', 0))} --> {format_timestamp(result.get('end', 0))}] "
+                      f"{result['text']}", flush=True)
+    except (IOError, ValueError, wave.Error) as e:
+        print(f"Batch transcription failed: {e}", file=sys.stderr)
+        return 1
+
+    elapsed = time.time() - started
+    speed = audio.duration / elapsed if elapsed > 0 else 0
+    print(f"Transcribed {audio.duration:.1f}s of audio in {elapsed:.1f}s ({speed:.1f}x realtime).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Regenerates the bundled benchmark clip, benchmarks/fixtures/synthetic_speech.wav.
+
+    python benchmarks/make_fixture.py
+
+The clip is synthesized, not recorded, so it can be shipped with no licensing
+questions and is bit-for-bit identical on every machine: voiced "syllables"
+(a glottal pulse train through vowel formants, with a wandering pitch) and
+noise-burst consonants, grouped into words and phrases separated by pauses,
+over a quiet noise floor. It exercises the recognizer, VAD and queueing the
+way speech does, so real-time factor, CPU and memory are comparable between
+releases; the words Vosk finds in it are meaningless. For caption latency
+and accuracy, benchmark real recordings as well.
+"""
+import os
+import sys
+import wave
+
+import numpy as np
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "synthetic_speech.wav")
+SAMPLE_RATE = 16000
+SECONDS = 8.0
+SEED = 20240601
+# (F1, F2, F3) in Hz for a, e, i, o, u.
+VOWEL_FORMANTS = [(730, 1090, 2440), (530, 1840, 2480), (270, 2290, 3010), (570, 840, 2410), (300, 870, 2240)]
+FORMANT_BANDWIDTH = 90.0
+
+
+def _formant_response(formants, length):
+    t = np.arange(length) / SAMPLE_RATE
+    decay = np.exp(-np.pi * FORMANT_BANDWIDTH * t)
+    return sum(decay * np.sin(2 * np.pi * f * t) / (i + 1) for i, f in enumerate(formants))
+
+
+def _syllable(rng):
+    seconds = rng.uniform(0.12, 0.25)
+    n = int(seconds * SAMPLE_RATE)
+    pitch = rng.uniform(100, 180) * np.linspace(1.0, rng.uniform(0.85, 1.15), n)
+    phase = np.cumsum(pitch / SAMPLE_RATE)
+    pulses = np.diff(np.floor(phase), prepend=0.0)
+    voiced = np.convolve(pulses, _formant_response(VOWEL_FORMANTS[rng.randint(len(VOWEL_FORMANTS))], 400))[:n]
+    voiced *= np.hanning(n)
+    consonant = rng.normal(0, 0.3, int(rng.uniform(0.02, 0.06) * SAMPLE_RATE))
+    return np.concatenate([consonant * np.hanning(len(consonant)), voiced])
+
+
+def synthesize():
+    rng = np.random.RandomState(SEED)
+    pieces, total = [], 0
+    target = int(SECONDS * SAMPLE_RATE)
+    while total < target:
+        for _ in range(rng.randint(2, 6)):  # words per phrase
+            word = np.concatenate([_syllable(rng) for _ in range(rng.randint(1, 4))])
+            pieces += [word, np.zeros(int(rng.uniform(0.03, 0.1) * SAMPLE_RATE))]
+        pieces.append(np.zeros(int(rng.uniform(0.3, 0.7) * SAMPLE_RATE)))
+        total = sum(len(p) for p in pieces)
+    signal = np.concatenate(pieces)[:target]
+    signal = 0.6 * signal / np.max(np.abs(signal)) + rng.normal(0, 0.002, target)
+    return (np.clip(signal, -1.0, 1.0) * 32767).astype('<i2')
+
+
+def main():
+    samples = synthesize()
+    os.makedirs(os.path.dirname(FIXTURE_PATH), exist_ok=True)
+    with wave.open(FIXTURE_PATH, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(samples.tobytes())
+    print(f"Wrote {FIXTURE_PATH} ({len(samples) / SAMPLE_RATE:.1f} s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Per-sentence MarianMT latency for each inference configuration.
+
+    python benchmarks/marian_latency.py --from English --to Spanish --json marian.json
+
+Every combination of beam count, int8 dynamic quantization and torch thread
+budget is loaded once, warmed up, and timed over the same sentences. The
+translation cache is disabled so every call reaches the model.
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from translator import MarianTranslator  # noqa: E402
+
+SENTENCES = [
+    "thank you",
+    "okay let's get started",
+    "can everybody hear me in the back of the room",
+    "today we are going to talk about the quarterly results and what they mean for next year",
+    "the weather tomorrow will be cloudy with a chance of rain in the afternoon",
+    "please remember to mute your microphone when you are not speaking",
+    "i think that is a really good question and i'm glad you asked it",
+    "we will take a short break and come back in about ten minutes",
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_config(from_lang, to_lang, num_beams, quantize, num_threads, repeats):
+    translator = MarianTranslator(from_lang, to_lang, num_beams=num_beams, quantize=quantize,
+                                  num_threads=num_threads)
+    if not translator.is_ready:
+        raise RuntimeError(f"MarianMT model for {from_lang} -> {to_lang} is not installed.")
+
+    translator.translate(SENTENCES[0])  # warm-up
+    latencies = []
+    for _ in range(repeats):
+        for sentence in SENTENCES:
+            started = time.perf_counter()
+            translator.translate(sentence)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+
+    return {
+        "num_beams": num_beams or "model default",
+        "quantize": quantize,
+        "num_threads": num_threads,
+        "sentences": len(latencies),
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--from", dest="from_lang", default="English")
+    parser.add_argument("--to", dest="to_lang", default="Spanish")
+    parser.add_argument("--beams", type=int, nargs="+", default=[0, 1, 2], help="0 means the model default")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'beams':>13} {'int8':>5} {'threads':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for num_beams, quantize, num_threads in itertools.product(args.beams, [False, True], args.threads):
+        result = run_config(args.from_lang, args.to_lang, num_beams or None, quantize, num_threads, args.repeats)
+        results.append(result)
+        print(f"{result['num_beams']!s:>13} {quantize!s:>5} {num_threads:>7} {result['mean_ms']:>9.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"from": args.from_lang, "to": args.to_lang, "results": results}, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
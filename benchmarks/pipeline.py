@@ -0,0 +1,172 @@
+"""Real-time factor, latency, CPU and memory of the full caption pipeline.
+
+    python benchmarks/pipeline.py --json pipeline.json
+    python benchmarks/pipeline.py talk.wav --block-sizes 1500 3000 6000 --backends none MarianMT
+
+Each WAV file (16-bit mono; by default every ``benchmarks/fixtures/*.wav``,
+which ships with a synthesized clip from make_fixture.py) is replayed through a
+TranscriptionEngine consuming an AudioBuffer, the same path the overlay's
+recognizer thread uses, once per block size and translation backend. Every
+run is a fresh interpreter so load time and peak memory are not shared.
+Without ``--realtime`` audio is queued as fast as the recognizer takes it, so
+the real-time factor is pure processing cost; with it, blocks arrive at
+capture speed and the latency figures match a live session.
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from audio import AudioBuffer  # noqa: E402
+from engine import (DEFAULT_BLOCK_SIZE, DEFAULT_MODEL_PATH, PARTIAL_PREFIX, TranscriptionEngine,  # noqa: E402
+                    load_settings_file, open_audio)
+from metrics import LatencyTracker, percentile, resident_memory_bytes  # noqa: E402
+
+FIXTURES_DIR = os.path.join(REPO_ROOT, "benchmarks", "fixtures")
+BACKENDS = ["none", "ArgosTranslate", "MarianMT"]
+POLL_INTERVAL = 0.02
+
+
+def run_once(wav_path, block_size, backend, settings, realtime):
+    """Replays one file through the engine in this process and returns its measurements."""
+    settings = dict(settings, block_size=block_size, translation_enabled=backend != "none")
+    if backend != "none":
+        settings['translation_backend'] = backend
+    if not realtime:
+        # Nothing is skipped when replaying faster than real time; the reader waits instead.
+        settings['audio_overload_policy'] = "block"
+
+    stream, sample_rate, close = open_audio(wav_path)
+    engine = TranscriptionEngine(settings, sample_rate, audio_queue=AudioBuffer.from_settings(settings, sample_rate))
+    engine.latency = LatencyTracker()
+    load_started = time.perf_counter()
+    if not engine.load():
+        raise RuntimeError(f"Vosk model '{settings.get('model_path', DEFAULT_MODEL_PATH)}' could not be loaded.")
+    if backend != "none" and engine.translation_stage is None:
+        return {"skipped": f"{backend} model for {settings.get('translation_target_language')} is not installed"}
+    load_seconds = time.perf_counter() - load_started
+
+    engine.start()
+    peak_rss = resident_memory_bytes() or 0
+    blocks, queued_seconds = 0, 0.0
+    cpu_started, started = time.process_time(), time.perf_counter()
+    try:
+        while True:
+            audio_data = stream.read(int(block_size) * 2)
+            if not audio_data:
+                break
+            if realtime:
+                time.sleep(max(0.0, started + queued_seconds - time.perf_counter()))
+            engine.audio_queue.put(audio_data, timeout=None)
+            blocks += 1
+            queued_seconds += len(audio_data) / 2 / sample_rate
+        while engine.blocks_received < blocks - engine.audio_queue.dropped_blocks:
+            time.sleep(POLL_INTERVAL)
+            peak_rss = max(peak_rss, resident_memory_bytes() or 0)
+        engine.flush()
+        wall = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+    finally:
+        engine.stop()
+        close()
+    peak_rss = max(peak_rss, resident_memory_bytes() or 0)
+
+    captions = []
+    while not engine.caption_queue.empty():
+        captions.append(engine.caption_queue.get_nowait())
+    finals = [c for c in captions if not c.startswith(PARTIAL_PREFIX)]
+    # From the capture of the block that completed a caption until it was ready for display.
+    lags = sorted((c.queued_at - c.captured_at) * 1000.0 for c in captions if c.captured_at is not None)
+    audio_seconds = engine.audio_seconds + engine.audio_queue.dropped_seconds
+    return {
+        "load_s": load_seconds,
+        "audio_s": audio_seconds,
+        "wall_s": wall,
+        "rtf": wall / audio_seconds if audio_seconds else None,
+        "recognizer_rtf": engine.recognizer_seconds / engine.audio_seconds if engine.audio_seconds else None,
+        "cpu_s": cpu,
+        "cpu_percent": 100.0 * cpu / wall if wall else None,
+        "peak_rss_mb": peak_rss / (1024.0 * 1024.0),
+        "blocks": blocks,
+        "dropped_blocks": engine.audio_queue.dropped_blocks,
+        "captions": len(finals),
+        "partials": len(captions) - len(finals),
+        "words": sum(len(c.split()) for c in finals),
+        "caption_latency_ms": {"count": len(lags), "p50": percentile(lags, 0.50), "p95": percentile(lags, 0.95),
+                               "p99": percentile(lags, 0.99)} if lags else None,
+        "stage_latency_ms": {stage: {key: value * 1000.0 if key != "count" else value for key, value in stats.items()}
+                             for stage, stats in engine.latency.summary().items()},
+    }
+
+
+def run_isolated(wav_path, block_size, backend, args):
+    """Runs one configuration in a fresh interpreter and returns its result."""
+    command = [sys.executable, os.path.abspath(__file__), "--one", wav_path, "--block-sizes", str(block_size),
+               "--backends", backend, "--model", args.model, "--translate-to", args.translate_to]
+    if args.settings:
+        command += ["--settings", args.settings]
+    if args.realtime:
+        command.append("--realtime")
+    proc = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit status {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("wavs", nargs="*", help="16-bit mono WAV files (default: benchmarks/fixtures/*.wav)")
+    parser.add_argument("--block-sizes", type=int, nargs="+", default=[1500, DEFAULT_BLOCK_SIZE, 6000])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--translate-to", default="Spanish")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Vosk model directory")
+    parser.add_argument("--settings", help="settings.json to start from (VAD, queue and Marian options)")
+    parser.add_argument("--realtime", action="store_true", help="feed audio at capture speed instead of flat out")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.one:
+        settings = dict(load_settings_file(args.settings), model_path=args.model,
+                        translation_target_language=args.translate_to)
+        result = run_once(args.wavs[0], args.block_sizes[0], args.backends[0], settings, args.realtime)
+        print(json.dumps(result))
+        return 0
+
+    wavs = args.wavs or sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.wav")))
+    if not wavs:
+        parser.error(f"no WAV files given and none found in {FIXTURES_DIR}")
+
+    results = []
+    print(f"{'file':<24} {'block':>6} {'backend':>14} {'RTF':>6} {'CPU %':>6} {'peak MB':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for wav_path, block_size, backend in itertools.product(wavs, args.block_sizes, args.backends):
+        result = dict(file=os.path.basename(wav_path), block_size=block_size, backend=backend,
+                      **run_isolated(wav_path, block_size, backend, args))
+        results.append(result)
+        if "rtf" not in result:
+            print(f"{result['file'][:24]:<24} {block_size:>6} {backend:>14}  {result.get('skipped') or result.get('error')}")
+            continue
+        lag = result["caption_latency_ms"] or {}
+        print(f"{result['file'][:24]:<24} {block_size:>6} {backend:>14} {result['rtf']:>6.3f} "
+              f"{result['cpu_percent']:>6.0f} {result['peak_rss_mb']:>8.0f} "
+              f"{lag.get('p50', 0):>8.0f} {lag.get('p95', 0):>8.0f}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "model": args.model,
+                       "realtime": args.realtime, "results": results}, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
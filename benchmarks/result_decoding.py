@@ -0,0 +1,119 @@
+"""Per-block overhead of the recognition loop around Kaldi: result decoding and caption queuing.
+
+    python benchmarks/result_decoding.py --blocks 200000 --json decoding.json
+
+The Vosk recognizer is replaced by one that replays canned result strings in
+Vosk's own formatting (partials growing a word at a time and repeating while
+the speaker is between words, silence, then a final with word timings), so
+only the Python work done per block in TranscriptionEngine.process_block is
+timed: the JSON decoder, with and without skipping unchanged partials.
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import ResultDecoder, TranscriptionEngine  # noqa: E402
+
+SENTENCES = [
+    "okay let's get started",
+    "can everybody hear me in the back of the room",
+    "today we are going to talk about the quarterly results and what they mean for next year",
+    "please remember to mute your microphone when you are not speaking",
+]
+REPEATS_PER_PARTIAL = 3
+SILENT_BLOCKS = 10
+
+
+def vosk_partial(text):
+    return '{\n  "partial" : "%s"\n}' % text
+
+
+def vosk_final(words):
+    result = [{"conf": 1.0, "end": 0.3 * i + 0.25, "start": 0.3 * i, "word": word} for i, word in enumerate(words)]
+    return json.dumps({"result": result, "text": " ".join(words)}, indent=2)
+
+
+def canned_results():
+    """One pass of (accepted, raw result) pairs, as the recognizer returns them block by block."""
+    script = []
+    for sentence in SENTENCES:
+        words = sentence.split()
+        for count in range(1, len(words) + 1):
+            script += [(False, vosk_partial(" ".join(words[:count])))] * REPEATS_PER_PARTIAL
+        script.append((True, vosk_final(words)))
+        script += [(False, vosk_partial(""))] * SILENT_BLOCKS
+    return script
+
+
+class CannedRecognizer:
+    """Stands in for vosk.KaldiRecognizer so decoding is timed without speech recognition."""
+
+    def __init__(self, script):
+        self.script = script
+        self.position = 0
+        self.raw = None
+
+    def AcceptWaveform(self, data):
+        accepted, self.raw = self.script[self.position]
+        self.position = (self.position + 1) % len(self.script)
+        return accepted
+
+    def Result(self):
+        return self.raw
+
+    def PartialResult(self):
+        return self.raw
+
+    def FinalResult(self):
+        return vosk_partial("")
+
+
+def run_config(loads, skip_unchanged, blocks):
+    engine = TranscriptionEngine({}, caption_queue=queue.Queue())
+    engine.recognizer = CannedRecognizer(canned_results())
+    engine.decoder = ResultDecoder(loads, skip_unchanged)
+    block = bytes(320)  # 10 ms; the canned recognizer ignores it
+    started = time.perf_counter()
+    for _ in range(blocks):
+        engine.process_block(block)
+    elapsed = time.perf_counter() - started
+    captions = engine.caption_queue.qsize()
+    return {"us_per_block": elapsed / blocks * 1e6, "captions_queued": captions}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=100000)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    decoders = [("json", json.loads)]
+    try:
+        import orjson
+        decoders.append(("orjson", orjson.loads))
+    except ImportError:
+        print("orjson is not installed; timing the json module only.", file=sys.stderr)
+
+    results = []
+    print(f"{'decoder':>8} {'skip repeats':>12} {'us/block':>9} {'captions':>9}")
+    for name, loads in decoders:
+        for skip_unchanged in (False, True):
+            result = dict(decoder=name, skip_unchanged=skip_unchanged,
+                          **run_config(loads, skip_unchanged, args.blocks))
+            results.append(result)
+            print(f"{name:>8} {skip_unchanged!s:>12} {result['us_per_block']:>9.2f} {result['captions_queued']:>9}",
+                  flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"blocks": args.blocks, "script_blocks": len(canned_results()), "results": results}, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Import-time and memory report for the modules LiveScript loads at startup.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --json startup.json
+
+Each module is imported in a fresh interpreter under ``-X importtime``; the
+report lists the total import time, the slowest packages pulled in and the
+child's peak RSS. Pass ``--with-translation`` to also import the translation
+backends, which is what every startup paid before they were loaded lazily.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["translator", "engine"]
+TRANSLATION_MODULES = ["argostranslate.translate", "transformers", "torch"]
+
+PEAK_RSS_SNIPPET = (
+    "import resource, sys; "
+    "r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+    "sys.stderr.write('peak_rss_kb: %d\\n' % (r // 1024 if sys.platform == 'darwin' else r))"
+)
+
+
+def parse_importtime(stderr):
+    """Returns {package: (self_us, cumulative_us)} from -X importtime output."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Nested imports are indented by two spaces per level after the separator's own space.
+        imports[name[1:].rstrip()] = (int(self_us), int(cumulative_us))
+    return imports
+
+
+def measure(modules, top):
+    code = "; ".join(f"import {m}" for m in modules) + "; " + PEAK_RSS_SNIPPET
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    imports = parse_importtime(proc.stderr)
+    peak_rss_kb = next(int(line.split()[-1]) for line in proc.stderr.splitlines() if line.startswith("peak_rss_kb:"))
+    top_level = [name for name in imports if not name.startswith(" ")]
+    slowest = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        "modules": modules,
+        "total_ms": sum(imports[name][1] for name in top_level) / 1000.0,
+        "peak_rss_mb": peak_rss_kb / 1024.0,
+        "slowest": [{"package": name.strip(), "cumulative_ms": cumulative / 1000.0}
+                    for name, (_, cumulative) in slowest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--with-translation", action="store_true",
+                        help="also import the translation backends for comparison")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest packages to list")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    runs = [args.modules]
+    if args.with_translation:
+        runs.append(args.modules + TRANSLATION_MODULES)
+
+    results = []
+    for modules in runs:
+        result = measure(modules, args.top)
+        results.append(result)
+        print(f"import {', '.join(modules)}: {result['total_ms']:.0f} ms, peak RSS {result['peak_rss_mb']:.0f} MB")
+        for entry in result["slowest"]:
+            print(f"    {entry['cumulative_ms']:>9.1f} ms  {entry['package']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
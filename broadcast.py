@@ -0,0 +1,258 @@
+"""Fan-out of the caption stream to the overlay, browser overlays and log files."""
+import collections
+import json
+import queue
+import sys
+import threading
+import time
+
+# --- Constants ---
+PARTIAL_PREFIX = "... "
+DEFAULT_MAX_FINALS = 256
+DEFAULT_SSE_PORT = 9465
+SSE_KEEPALIVE_SECONDS = 15.0
+
+OVERLAY_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Live Captions</title>
+<style>
+body { margin: 0; background: transparent; color: #fff; font: bold 32px sans-serif;
+       text-shadow: 0 0 4px #000, 0 0 4px #000; }
+#captions { position: fixed; bottom: 0; padding: 10px; }
+#partial { opacity: 0.7; }
+</style></head>
+<body><div id="captions"><span id="finals"></span> <span id="partial"></span></div>
+<script>
+var finals = [], events = new EventSource("/captions");
+events.addEventListener("final", function (e) {
+  finals.push(JSON.parse(e.data).text);
+  finals = finals.slice(-2);
+  document.getElementById("finals").textContent = finals.join(" ");
+  document.getElementById("partial").textContent = "";
+});
+events.addEventListener("partial", function (e) {
+  document.getElementById("partial").textContent = JSON.parse(e.data).text;
+});
+</script></body></html>
+"""
+
+
+class Subscription:
+    """
+    One subscriber's mailbox, readable like a queue.Queue.
+
+    Finals are kept in order; partials are coalesced so only the newest one
+    per source waits, and it is dropped when a final from the same source
+    arrives. A subscriber more than
+    `max_finals` finals behind loses the oldest ones (counted in `dropped`)
+    instead of growing a backlog.
+    """
+
+    def __init__(self, name=None, max_finals=DEFAULT_MAX_FINALS, notify=None):
+        self.name = name
+        self.max_finals = max(1, int(max_finals))
+        self.notify = notify
+        self.dropped = 0
+        self._finals = collections.deque()
+        # Newest waiting partial of each caption source.
+        self._partials = {}
+        self._condition = threading.Condition()
+
+    def put(self, caption):
+        with self._condition:
+            source = getattr(caption, 'source', None)
+            if caption.startswith(PARTIAL_PREFIX):
+                self._partials[source] = caption
+            else:
+                self._partials.pop(source, None)
+                self._finals.append(caption)
+                if len(self._finals) > self.max_finals:
+                    self._finals.popleft()
+                    self.dropped += 1
+            self._condition.notify()
+        if self.notify:
+            self.notify()
+
+    def _take(self):
+        if self._finals:
+            return self._finals.popleft()
+        if self._partials:
+            return self._partials.pop(next(iter(self._partials)))
+        return None
+
+    def get(self, block=True, timeout=None):
+        """Returns the next caption: queued finals first, then each source's newest partial. Raises queue.Empty."""
+        with self._condition:
+            if block and not self._condition.wait_for(lambda: self._finals or self._partials, timeout):
+                raise queue.Empty
+            caption = self._take()
+        if caption is None:
+            raise queue.Empty
+        return caption
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self):
+        with self._condition:
+            return len(self._finals) + len(self._partials)
+
+
+class CaptionBroadcaster:
+    """
+    Publishes every caption to all subscribers without letting one slow the others.
+
+    It has the put()/qsize() side of queue.Queue, so engines and capture
+    threads use it as their caption queue. publish() only touches each
+    subscriber's mailbox, so it never waits on a reader.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, name=None, max_finals=DEFAULT_MAX_FINALS, notify=None):
+        subscription = Subscription(name, max_finals, notify)
+        with self._lock:
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    @property
+    def subscribers(self):
+        return list(self._subscribers)
+
+    def publish(self, caption):
+        for subscription in self._subscribers:
+            subscription.put(caption)
+
+    put = publish
+
+    def qsize(self):
+        """The largest backlog of any subscriber."""
+        return max((s.qsize() for s in self._subscribers), default=0)
+
+
+def caption_event(caption):
+    """Returns (event type, JSON payload) describing a caption for remote viewers."""
+    partial = caption.startswith(PARTIAL_PREFIX)
+    payload = {"text": caption[len(PARTIAL_PREFIX):] if partial else str(caption)}
+    original = getattr(caption, 'original', None)
+    if original is not None:
+        payload["original"] = original
+    source = getattr(caption, 'source', None)
+    if source is not None:
+        payload["source"] = source
+    return ("partial" if partial else "final"), json.dumps(payload)
+
+
+class CaptionLogSink:
+    """Appends every final caption, with a timestamp, to a text file on its own thread."""
+
+    def __init__(self, broadcaster, path, stop_event):
+        self.path = path
+        self.stop_event = stop_event
+        self.subscription = broadcaster.subscribe("log")
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while not self.stop_event.is_set():
+                try:
+                    caption = self.subscription.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                if caption.startswith(PARTIAL_PREFIX):
+                    continue
+                original = getattr(caption, 'original', None)
+                suffix = f"  [{original}]" if original is not None else ""
+                f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}  {caption}{suffix}\n")
+                f.flush()
+
+
+class SSEServer:
+    """
+    Serves the caption stream as Server-Sent Events on http://host:port/captions,
+    with a ready-made overlay page at / for OBS browser sources. Each browser
+    gets its own subscription, so a stalled one only coalesces its own partials.
+    The stream is a transcript of all captured audio, so other web pages may
+    only read it if their origin is given as `allow_origin`.
+    """
+
+    def __init__(self, broadcaster, port=DEFAULT_SSE_PORT, host="127.0.0.1", allow_origin=None):
+        self.broadcaster = broadcaster
+        self.port = port
+        self.host = host
+        self.allow_origin = allow_origin
+        self._httpd = None
+
+    @classmethod
+    def from_settings(cls, broadcaster, settings):
+        if not settings.get('sse_enabled', False):
+            return None
+        return cls(broadcaster, settings.get('sse_port', DEFAULT_SSE_PORT), settings.get('sse_host', "127.0.0.1"),
+                   settings.get('sse_allow_origin') or None)
+
+    def start(self):
+        """Starts serving on a daemon thread. Returns False (after printing why) if the port is unavailable."""
+        import http.server
+
+        broadcaster, allow_origin = self.broadcaster, self.allow_origin
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/":
+                    body = OVERLAY_PAGE.encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                elif path == "/captions":
+                    self._stream()
+                else:
+                    self.send_error(404)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                if allow_origin:
+                    self.send_header("Access-Control-Allow-Origin", allow_origin)
+                self.end_headers()
+                subscription = broadcaster.subscribe("sse")
+                try:
+                    while True:
+                        try:
+                            event, data = caption_event(subscription.get(timeout=SSE_KEEPALIVE_SECONDS))
+                            self.wfile.write(f"event: {event}\ndata: {data}\n\n".encode("utf-8"))
+                        except queue.Empty:
+                            self.wfile.write(b": keepalive\n\n")
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    broadcaster.unsubscribe(subscription)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._httpd = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Caption stream disabled: cannot listen on {self.host}:{self.port} ({e})", file=sys.stderr)
+            return False
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        print(f"Streaming captions on http://{self.host}:{self.port}/ (events at /captions)")
+        return True
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
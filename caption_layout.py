@@ -0,0 +1,96 @@
+"""Incremental, pixel-accurate line wrapping for the caption overlay."""
+import collections
+
+# --- Constants ---
+MAX_CACHED_WIDTHS = 20000
+
+
+class CaptionLayout:
+    """
+    Wraps captions into lines no wider than `max_width` pixels.
+
+    Finalized captions are wrapped once as they arrive and only the last
+    `max_lines` lines are kept, so adding a caption or re-rendering the partial
+    costs the same however long the session has run. Word widths come from
+    `measure` (e.g. tkfont.Font.measure) and are memoized.
+    """
+
+    def __init__(self, measure, max_width, max_lines):
+        self.measure = measure
+        self.max_width = max(1, int(max_width))
+        self.max_lines = max(1, int(max_lines))
+        self.version = 0
+        self._widths = {}
+        self._space_width = measure(" ")
+        self.clear()
+
+    def clear(self):
+        self._lines = collections.deque(maxlen=self.max_lines)
+        self._open_words = []
+        self._open_width = 0
+        self.version += 1
+
+    def word_width(self, word):
+        width = self._widths.get(word)
+        if width is None:
+            if len(self._widths) >= MAX_CACHED_WIDTHS:
+                self._widths.clear()
+            width = self._widths[word] = self.measure(word)
+        return width
+
+    def _split_long_word(self, word):
+        # A single word wider than the window is broken wherever it fills a line.
+        pieces, current = [], ""
+        for char in word:
+            if current and self.word_width(current + char) > self.max_width:
+                pieces.append(current)
+                current = char
+            else:
+                current += char
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _place(self, words, open_words, open_width, closed):
+        """Flows words after an open line. Appends finished lines to `closed`; returns the new open line."""
+        open_words = list(open_words)
+        for word in words:
+            width = self.word_width(word)
+            pieces = [(word, width)] if width <= self.max_width else [
+                (piece, self.word_width(piece)) for piece in self._split_long_word(word)]
+            for piece, piece_width in pieces:
+                needed = piece_width + (self._space_width if open_words else 0)
+                if open_words and open_width + needed > self.max_width:
+                    closed.append(" ".join(open_words))
+                    open_words, open_width = [], 0
+                    needed = piece_width
+                open_words.append(piece)
+                open_width += needed
+        return open_words, open_width
+
+    def add_final(self, text, new_line=False):
+        """Wraps a finalized caption onto the end of the layout, starting a fresh line if `new_line`."""
+        words = text.split()
+        if not words:
+            return
+        if new_line and self._open_words:
+            self._lines.append(" ".join(self._open_words))
+            self._open_words, self._open_width = [], 0
+        self._open_words, self._open_width = self._place(words, self._open_words, self._open_width, self._lines)
+        self.version += 1
+
+    def render(self, partial_text="", line_partials=()):
+        """
+        Returns the last `max_lines` lines, with the partial caption wrapped after the finalized text.
+        Each of `line_partials` (e.g. one per audio source) starts on a line of its own.
+        """
+        extra = []
+        open_words, _ = self._place(partial_text.split(), self._open_words, self._open_width, extra)
+        lines = list(self._lines) + extra
+        if open_words:
+            lines.append(" ".join(open_words))
+        for partial in line_partials:
+            open_words, _ = self._place(partial.split(), [], 0, lines)
+            if open_words:
+                lines.append(" ".join(open_words))
+        return lines[-self.max_lines:]
@@ -0,0 +1,872 @@
+"""Headless transcription engine shared by the caption overlay and the command line.
+
+Run ``python -m engine recording.wav`` to transcribe a file, or pipe raw
+16-bit mono PCM in with ``python -m engine -``.
+"""
+import argparse
+import collections
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import wave
+
+import vosk
+
+try:
+    # Several times faster than the json module on Vosk's small result objects.
+    from orjson import loads as fast_json_loads
+except ImportError:
+    fast_json_loads = json.loads
+
+from audio import AudioBuffer, VoiceActivityGate
+from metrics import BehindAlarm, MetricsServer, latency_tracker
+from models import model_registry, vosk_key
+from subtitles import SubtitleWriter
+from translator import get_translator
+
+# AcceptWaveform hands its argument straight to a cffi `const char *`, which takes bytes or
+# cdata but no other buffer. ffi.from_buffer wraps a memoryview (a PcmRing slot, VAD pre-roll)
+# without copying it; a vosk without that attribute gets a copy.
+_vosk_ffi = getattr(vosk, '_ffi', None)
+_waveform_from_buffer = _vosk_ffi.from_buffer if _vosk_ffi is not None else bytes
+
+# --- Constants ---
+SAMPLE_RATE = 16000
+DEFAULT_BLOCK_SIZE = 3000
+DEFAULT_MODEL_PATH = "vosk-model-small-en-us-0.15"
+PARTIAL_PREFIX = "... "
+TRANSLATION_QUEUE_SIZE = 8
+TRANSLATION_MAX_BATCH = 8
+PARTIAL_POLICIES = ("always", "debounce", "word_delta", "finals_only")
+DEFAULT_PARTIAL_MAX_RATE = 5.0
+ENGINE_LATENCY_STAGES = ("audio_queue", "recognition", "translation")
+# Settings that reload() picks up while running, grouped by what a change costs.
+MODEL_SETTINGS = ("model_path",)
+TRANSLATION_SETTINGS = ("translation_enabled", "translation_backend", "translation_target_language", "language",
+                        "marian_num_beams", "marian_max_new_tokens", "marian_quantize", "torch_num_threads")
+RUNTIME_SETTINGS = ("partial_translation_policy", "partial_translation_debounce", "partial_translation_min_words",
+                    "vad_enabled", "vad_threshold_db", "vad_hangover", "vad_preroll", "vad_spectral",
+                    "audio_overload_policy", "partial_max_rate")
+# How long a reloaded model waits for a pause in speech before it is swapped in anyway.
+RELOAD_MAX_WAIT = 3.0
+
+
+class Caption(str):
+    """
+    Caption text that also carries time.monotonic() timestamps from each pipeline stage.
+
+    It is a plain str to every consumer that only wants the text; metrics.LatencyTracker
+    reads the timestamps. Stages that did not happen (e.g. translation) stay None.
+    `source` names the audio stream it came from when several are captioned at once, and
+    `original` holds the recognized text of a translated caption. Final captions also
+    carry `start`/`end` and `words`, a list of (word, start, end), in seconds of stream
+    time since the engine started, counting audio the recognizer never saw.
+    """
+    captured_at = dequeued_at = recognized_at = translated_at = queued_at = displayed_at = None
+    source = original = None
+    start = end = words = None
+
+    def __new__(cls, text, **timestamps):
+        caption = super().__new__(cls, text)
+        for name, value in timestamps.items():
+            setattr(caption, name, value)
+        return caption
+
+    def with_text(self, text, **timestamps):
+        """Returns a new caption with different text and the same (plus any given) timestamps."""
+        return Caption(text, **dict(vars(self), **timestamps))
+
+
+class ResultDecoder:
+    """
+    Parses the JSON strings the recognizer returns for every block.
+
+    While a speaker pauses or between words, PartialResult() returns the same
+    string block after block; with `skip_unchanged` such a repeat is recognized
+    by string comparison and not parsed again. `loads` defaults to orjson when
+    it is installed.
+    """
+
+    def __init__(self, loads=None, skip_unchanged=True):
+        self.loads = loads or fast_json_loads
+        self.skip_unchanged = skip_unchanged
+        self._last_partial = None
+
+    def partial(self, raw):
+        """Returns the partial text, or None if `raw` is the same as the previous partial."""
+        if self.skip_unchanged and raw == self._last_partial:
+            return None
+        self._last_partial = raw
+        return self.loads(raw).get('partial', '')
+
+    def final(self, raw):
+        """Returns a final result as a dict and forgets the last partial."""
+        self._last_partial = None
+        return self.loads(raw)
+
+
+class PartialGate:
+    """
+    Decides which partial results are shown at all.
+
+    A partial passes only when its words differ from the last one shown, and
+    at most `max_rate` times a second (0 means no limit). A partial held back
+    by the rate limit is released by take_pending() once the interval is over,
+    unless a newer one or the final result replaces it first. Everything
+    downstream (translation, the caption queue, rendering) only sees what
+    passes.
+    """
+
+    def __init__(self, max_rate=DEFAULT_PARTIAL_MAX_RATE):
+        self.min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('partial_max_rate', DEFAULT_PARTIAL_MAX_RATE))
+
+    def reset(self):
+        """Forgets the current utterance; called whenever a final result arrives."""
+        self._last_words = None
+        self._last_time = float("-inf")
+        self._pending = None
+
+    def offer(self, partial_text, now=None):
+        """Returns the text if it should be shown now, otherwise None (keeping it if it is only early)."""
+        words = partial_text.split()
+        if words == self._last_words:
+            self._pending = None
+            return None
+        now = time.monotonic() if now is None else now
+        if now - self._last_time < self.min_interval:
+            self._pending = partial_text
+            return None
+        self._pending = None
+        self._last_words = words
+        self._last_time = now
+        return partial_text
+
+    def take_pending(self, now=None):
+        """Returns a held-back partial once its interval has passed, otherwise None."""
+        if self._pending is None:
+            return None
+        return self.offer(self._pending, now)
+
+
+class PartialTranslationPolicy:
+    """
+    Decides which partial results are worth translating.
+
+    "always" translates every partial, "debounce" at most one every `debounce`
+    seconds, "word_delta" only once the partial has grown by `min_words` words,
+    and "finals_only" never translates partials at all.
+    """
+
+    def __init__(self, mode="always", debounce=0.5, min_words=2):
+        self.mode = mode if mode in PARTIAL_POLICIES else "always"
+        self.debounce = float(debounce)
+        self.min_words = max(1, int(min_words))
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(settings.get('partial_translation_policy', "always"),
+                   settings.get('partial_translation_debounce', 0.5),
+                   settings.get('partial_translation_min_words', 2))
+
+    def reset(self):
+        """Forgets the current utterance; called whenever a final result arrives."""
+        self._last_time = 0.0
+        self._last_word_count = 0
+
+    def should_translate(self, partial_text, now=None):
+        if self.mode == "always":
+            return True
+        if self.mode == "finals_only":
+            return False
+        if self.mode == "debounce":
+            now = time.time() if now is None else now
+            if now - self._last_time < self.debounce:
+                return False
+            self._last_time = now
+            return True
+        word_count = len(partial_text.split())
+        if word_count - self._last_word_count < self.min_words:
+            return False
+        self._last_word_count = word_count
+        return True
+
+
+class TranslationStage:
+    """
+    Translates captions on worker threads so recognition never waits on the translator.
+
+    Captions are numbered as they are submitted and released to `emit` strictly
+    in that order, however many workers there are. Only finals are queued up to
+    `maxsize`; a queued partial is dropped as soon as anything newer arrives,
+    since the overlay would replace it anyway. When finals pile up, a worker
+    takes up to `max_batch` of them and translates them in one batched call.
+    """
+
+    def __init__(self, translator, emit, stop_event, workers=1, maxsize=TRANSLATION_QUEUE_SIZE,
+                 max_batch=TRANSLATION_MAX_BATCH):
+        self.translator = translator
+        self.emit = emit
+        self.stop_event = stop_event
+        self.maxsize = maxsize
+        self.max_batch = max(1, int(max_batch))
+        self.dropped_partials = 0
+
+        self._items = collections.deque()
+        self._condition = threading.Condition()
+        self._next_seq = 0
+        self._next_out = 0
+        self._finished = {}
+        self._outbox = collections.deque()
+        self._emit_lock = threading.Lock()
+        self._in_flight = 0
+        self._closed = False
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(max(1, int(workers)))]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, text, partial=False, raw=False):
+        """
+        Queues a Caption for translation. Blocks only if `maxsize` finals are already waiting.
+        Raw text (e.g. a status marker) keeps its place in line but is not translated.
+        """
+        with self._condition:
+            stale = [item for item in self._items if item[2]]
+            for item in stale:
+                self._items.remove(item)
+                self.dropped_partials += 1
+                self._finish(item[0], None)
+            while len(self._items) >= self.maxsize and not self.stop_event.is_set():
+                self._condition.wait(0.1)
+            self._items.append((self._next_seq, text, partial, raw))
+            self._next_seq += 1
+            self._condition.notify_all()
+        self._deliver_ready()
+
+    @property
+    def pending(self):
+        """Captions queued or being translated."""
+        with self._condition:
+            return len(self._items) + self._in_flight
+
+    def drain(self, timeout=None):
+        """Waits until every submitted caption has been emitted. Returns False on timeout."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while (self._items or self._in_flight or self._outbox) and not self.stop_event.is_set():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(0.1 if remaining is None else min(0.1, remaining))
+        return True
+
+    def close(self):
+        """Stops the workers once the queue is empty. Call drain() first to deliver everything pending."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _worker(self):
+        while not self.stop_event.is_set() and not (self._closed and not self._items):
+            with self._condition:
+                if not self._items:
+                    self._condition.wait(0.1)
+                    continue
+                batch = [self._items.popleft()]
+                if not batch[0][2] and not batch[0][3]:
+                    while (self._items and not self._items[0][2] and not self._items[0][3]
+                           and len(batch) < self.max_batch):
+                        batch.append(self._items.popleft())
+                self._in_flight += len(batch)
+                self._condition.notify_all()
+
+            translations = None
+            try:
+                if len(batch) == 1:
+                    seq, text, partial, raw = batch[0]
+                    translations = [text if raw else self.translator.translate(text, persist=not partial)]
+                else:
+                    translations = self.translator.translate_batch([item[1] for item in batch])
+            except Exception as e:
+                # A dead worker would leave drain() waiting forever; show the source text instead.
+                print(f"Translation failed: {e}", file=sys.stderr)
+                error_tag = getattr(self.translator, 'ERROR_TAG', "[Translation Error]")
+                translations = [item[1] if item[3] else f"{error_tag} {item[1]}" for item in batch]
+            finally:
+                translated_at = time.monotonic()
+                with self._condition:
+                    self._in_flight -= len(batch)
+                    for (seq, source, partial, raw), translated in zip(batch, translations or [None] * len(batch)):
+                        if translated is None:
+                            self._finish(seq, None)
+                            continue
+                        text = PARTIAL_PREFIX + translated if partial else translated
+                        if raw:
+                            self._finish(seq, source.with_text(text))
+                        else:
+                            self._finish(seq, source.with_text(text, translated_at=translated_at,
+                                                                original=str(source)))
+                    self._condition.notify_all()
+            self._deliver_ready()
+
+    def _finish(self, seq, text):
+        # Called with the condition held. Moves every caption that is now next in line to the outbox.
+        self._finished[seq] = text
+        while self._next_out in self._finished:
+            ready = self._finished.pop(self._next_out)
+            self._next_out += 1
+            if ready is not None:
+                self._outbox.append(ready)
+
+    def _deliver_ready(self):
+        """
+        Passes the outbox to `emit` without holding the condition, so submit() never waits
+        on a slow listener. One thread emits at a time, in order; a thread that finds
+        another one emitting leaves its captions to it.
+        """
+        while self._emit_lock.acquire(blocking=False):
+            try:
+                caption = None
+                while True:
+                    with self._condition:
+                        if caption is not None:
+                            self._outbox.popleft()
+                        if not self._outbox:
+                            self._condition.notify_all()
+                            break
+                        caption = self._outbox[0]
+                    self.emit(caption)
+            finally:
+                self._emit_lock.release()
+            # Captions added after the emitting thread last looked would otherwise wait for the next one.
+            with self._condition:
+                if not self._outbox:
+                    return
+
+
+class TranscriptionEngine:
+    """
+    Runs Vosk recognition and optional translation over a queue of PCM blocks.
+
+    The engine owns its audio queue, caption queue and stop event, so several
+    engines can run side by side and none of them needs a GUI. Captions are
+    Caption strings; partial results are prefixed with "... ". An optional
+    audio.BlockSizeController is told how long each block took to recognize.
+    With several audio sources, run one engine per source: each gets its own
+    recognizer on the shared model, tags its captions with `source`, and
+    scales across cores since Vosk releases the GIL while decoding.
+    """
+
+    def __init__(self, settings, sample_rate=SAMPLE_RATE, audio_queue=None, caption_queue=None, stop_event=None,
+                 on_caption=None, block_sizer=None, source=None):
+        self.settings = settings
+        self.sample_rate = sample_rate
+        self.audio_queue = audio_queue if audio_queue is not None else AudioBuffer.from_settings(settings, sample_rate)
+        self.caption_queue = caption_queue if caption_queue is not None else queue.Queue()
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.on_caption = on_caption
+        self.block_sizer = block_sizer
+        self.source = source
+
+        self.model = None
+        self.recognizer = None
+        self.translator = None
+        self.translation_stage = None
+        self.partial_policy = PartialTranslationPolicy.from_settings(settings)
+        self.decoder = ResultDecoder()
+        self.partial_gate = PartialGate.from_settings(settings)
+        self.vad = VoiceActivityGate.from_settings(settings, sample_rate) if settings.get('vad_enabled') else None
+        self.last_caption_time = time.time()
+        self.blocks_received = 0
+        self.blocks_processed = 0
+        self.audio_seconds = 0.0
+        self.recognizer_seconds = 0.0
+        # Stream time: all audio that reached the engine, including what VAD or overload skipped.
+        # Each (recognizer time, offset) pair maps the recognizer's own clock onto it from that point on.
+        self.stream_seconds = 0.0
+        self._recognizer_audio = 0.0
+        self._clock_offsets = [(0.0, 0.0)]
+        self.latency = latency_tracker
+        self.behind_alarm = BehindAlarm(settings.get('latency_alert_seconds', 5.0))
+        self._block_times = {}
+        self._thread = None
+
+        # Hot reload: keys of the settings last requested (possibly still loading) and of the model in use.
+        self._requested_keys = self._settings_keys(settings)
+        self._requested_settings = settings
+        self._active_model_key = None
+        self._model_path = None
+        self._utterance_open = False
+        self._pending_swap = None
+        self._pending_since = None
+        self._swap_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        # Registry keys of the models this engine runs on, by role ("vosk", "translator").
+        self._held_models = {}
+
+    @staticmethod
+    def _settings_keys(settings):
+        return tuple(tuple(settings.get(name) for name in names)
+                     for names in (MODEL_SETTINGS, TRANSLATION_SETTINGS, RUNTIME_SETTINGS))
+
+    def _load_recognizer(self, model_path):
+        # The model is shared through the registry; each engine only needs its own recognizer.
+        model = model_registry.vosk_model(model_path)
+        recognizer = vosk.KaldiRecognizer(model, self.sample_rate)
+        recognizer.SetWords(True)
+        return model, recognizer
+
+    def _make_translation_stage(self, translator):
+        return TranslationStage(translator, self.emit, self.stop_event, self.settings.get('translation_workers', 1),
+                                max_batch=self.settings.get('translation_max_batch', TRANSLATION_MAX_BATCH))
+
+    def _hold(self, role, key):
+        # Acquired before the old one is released, so switching to the same model keeps it loaded.
+        model_registry.acquire(key)
+        old_key = self._held_models.pop(role, None)
+        model_registry.release(old_key)
+        if old_key != key:
+            # Switched away: free the old model unless another engine still runs on it.
+            model_registry.discard_unused(old_key)
+        self._held_models[role] = key
+
+    def load(self):
+        """Loads the Vosk model and translator. Returns False if the model could not be loaded."""
+        model_path = self.settings.get('model_path', DEFAULT_MODEL_PATH)
+        try:
+            self.model, self.recognizer = self._load_recognizer(model_path)
+            self._active_model_key = (self.settings.get('model_path'),)
+            self._model_path = model_path
+            self._hold("vosk", vosk_key(model_path))
+            print("Vosk model loaded.", file=sys.stderr)
+        except Exception as e:
+            print(f"Error loading Vosk model: {e}", file=sys.stderr)
+            self.emit("ERROR: Failed to load Vosk model. Please check settings.")
+            return False
+
+        self.translator = get_translator(self.settings)
+        self._hold("translator", getattr(self.translator, 'registry_key', None))
+        if self.translator:
+            print(f"Translation enabled with backend: {self.settings.get('translation_backend')}", file=sys.stderr)
+            if self.translator.is_ready:
+                self.translation_stage = self._make_translation_stage(self.translator)
+        else:
+            print("Translation disabled.", file=sys.stderr)
+        return True
+
+    def reload(self, settings, force=False):
+        """
+        Applies changed settings without stopping recognition. A new Vosk model or
+        translator is loaded on a background thread; it and any cheaper changes
+        (VAD, partial policy, overload policy) are swapped in by the recognizer
+        thread at the next pause in speech, or after RELOAD_MAX_WAIT seconds.
+        `force` reloads the translator, and a model that failed to load, even if
+        the settings look unchanged, e.g. after a download. Returns True if
+        anything is being reloaded.
+        """
+        keys = self._settings_keys(settings)
+        model_key, translation_key, runtime_key = keys
+        requested_model, requested_translation, requested_runtime = self._requested_keys
+        reload_model = model_key != requested_model or (force and model_key != self._active_model_key)
+        reload_translator = force or translation_key != requested_translation
+        if not (reload_model or reload_translator or runtime_key != requested_runtime):
+            return False
+        self._requested_keys = keys
+        settings = dict(settings)
+        with self._swap_lock:
+            self._requested_settings = settings
+        if reload_model or reload_translator:
+            threading.Thread(target=self._load_replacement, args=(settings, reload_model, reload_translator),
+                             daemon=True).start()
+        else:
+            self._queue_swap({})
+        return True
+
+    def _load_replacement(self, settings, reload_model, reload_translator):
+        # Serialized so that overlapping reloads are swapped in the order they were requested.
+        with self._reload_lock:
+            replacement = {}
+            if reload_model:
+                model_path = settings.get('model_path', DEFAULT_MODEL_PATH)
+                try:
+                    replacement['model'] = self._load_recognizer(model_path)
+                    replacement['model_key'] = (settings.get('model_path'),)
+                    replacement['model_path'] = model_path
+                    print(f"Vosk model '{model_path}' loaded; switching at the next pause.", file=sys.stderr)
+                except Exception as e:
+                    print(f"Error loading Vosk model: {e}. Keeping the current model.", file=sys.stderr)
+            if reload_translator:
+                translator = get_translator(settings)
+                if translator and not translator.is_ready:
+                    print(f"{translator.BACKEND} model is not installed; translation is off until it is.",
+                          file=sys.stderr)
+                replacement['translator'] = translator if translator and translator.is_ready else None
+            self._queue_swap(replacement)
+
+    def _queue_swap(self, replacement):
+        with self._swap_lock:
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            self._pending_swap = dict(self._pending_swap or {}, **replacement)
+
+    def _apply_pending_swap(self):
+        """Runs on the recognizer thread: swaps in reloaded parts once the speaker pauses."""
+        with self._swap_lock:
+            if self._pending_swap is None:
+                return
+            if self._utterance_open and time.monotonic() - self._pending_since < RELOAD_MAX_WAIT:
+                return
+            replacement, self._pending_swap, self._pending_since = self._pending_swap, None, None
+            # Always the newest request: a model that took a while to load must not
+            # undo a cheaper change (e.g. Skip Silence) made while it was loading.
+            settings = self.settings = self._requested_settings
+
+        self.partial_policy = PartialTranslationPolicy.from_settings(settings)
+        self.partial_gate = PartialGate.from_settings(settings)
+        self.vad = VoiceActivityGate.from_settings(settings, self.sample_rate) if settings.get('vad_enabled') else None
+        if hasattr(self.audio_queue, 'policy'):
+            self.audio_queue.policy = settings.get('audio_overload_policy', self.audio_queue.policy)
+
+        if 'model' in replacement:
+            if self.recognizer is not None:
+                # Only holds words if RELOAD_MAX_WAIT ran out mid-utterance.
+                self._finalize()
+            # The old model is freed with its last reference, unless another engine still uses it.
+            self._hold("vosk", vosk_key(replacement['model_path']))
+            self.model, self.recognizer = replacement['model']
+            self.decoder = ResultDecoder()
+            # The new recognizer's word times start from zero.
+            self._recognizer_audio = 0.0
+            self._clock_offsets = [(0.0, self.stream_seconds)]
+            self._active_model_key = replacement['model_key']
+            self._model_path = replacement['model_path']
+            print("Switched to the new Vosk model.", file=sys.stderr)
+
+        if 'translator' in replacement:
+            translator, stage = replacement['translator'], self.translation_stage
+            self._hold("translator", getattr(translator, 'registry_key', None))
+            self.translator = translator
+            if translator is None:
+                if stage:
+                    stage.drain()
+                    stage.close()
+                    self.translation_stage = None
+            elif stage:
+                # Batches already taken finish on the old translator; output order is unchanged.
+                stage.translator = translator
+            else:
+                self.translation_stage = self._make_translation_stage(translator)
+            print(f"Translation {'switched to ' + translator.BACKEND if translator else 'disabled'}.",
+                  file=sys.stderr)
+
+    def emit(self, text):
+        """Puts a caption on the caption queue and notifies the listener, if any."""
+        caption = text if isinstance(text, Caption) else Caption(text)
+        caption.queued_at = time.monotonic()
+        self.caption_queue.put(caption)
+        self.last_caption_time = time.time()
+        if caption.captured_at is not None:
+            self.latency.record_caption(caption, ENGINE_LATENCY_STAGES)
+            self.behind_alarm.check(caption.queued_at - caption.captured_at)
+        if self.on_caption:
+            self.on_caption(caption)
+
+    def _stream_time(self, recognizer_time):
+        for since, offset in reversed(self._clock_offsets):
+            if recognizer_time >= since:
+                return recognizer_time + offset
+        return recognizer_time + self._clock_offsets[0][1]
+
+    def _deliver_result(self, result):
+        """Delivers a parsed final Vosk result, with its word timings mapped to stream time."""
+        text = result.get('text', '')
+        if not text:
+            return
+        words = [(w['word'], self._stream_time(w['start']), self._stream_time(w['end']))
+                 for w in result.get('result', ())]
+        if words:
+            self._deliver(text, start=words[0][1], end=words[-1][2], words=words)
+        else:
+            self._deliver(text)
+
+    def _deliver(self, text, partial=False, raw=False, **timing):
+        """Sends recognized text to the caption queue, via the translation stage if one is running."""
+        caption = Caption(text, recognized_at=time.monotonic(), source=self.source, **self._block_times, **timing)
+        if self.translation_stage:
+            if raw:
+                pass
+            elif not partial:
+                self.partial_policy.reset()
+            elif not self.partial_policy.should_translate(text):
+                return
+            self.translation_stage.submit(caption, partial, raw)
+        else:
+            self.emit(caption.with_text(PARTIAL_PREFIX + text) if partial else caption)
+
+    def process_block(self, audio_data):
+        """Feeds one block of 16-bit PCM (bytes or a memoryview) to the recognizer and delivers any caption."""
+        seconds = len(audio_data) / 2 / self.sample_rate
+        waveform = audio_data if isinstance(audio_data, bytes) else _waveform_from_buffer(audio_data)
+        started = time.perf_counter()
+        accepted = self.recognizer.AcceptWaveform(waveform)
+        if accepted:
+            result = self.recognizer.Result()
+        else:
+            result = self.recognizer.PartialResult()
+        elapsed = time.perf_counter() - started
+        self.recognizer_seconds += elapsed
+        self.blocks_processed += 1
+        self.audio_seconds += seconds
+        self._recognizer_audio += seconds
+        if self.block_sizer is not None:
+            self.block_sizer.observe(elapsed, seconds, self.audio_queue.qsize())
+
+        if accepted:
+            self._utterance_open = False
+            self.partial_gate.reset()
+            self._deliver_result(self.decoder.final(result))
+        else:
+            partial_text = self.decoder.partial(result)
+            if partial_text is None:
+                # Unchanged; a partial held back by the rate limit may be due now.
+                partial_text = self.partial_gate.take_pending()
+            else:
+                self._utterance_open = bool(partial_text)
+                partial_text = self.partial_gate.offer(partial_text) if partial_text else None
+            if partial_text:
+                self._deliver(partial_text, partial=True)
+
+    def feed(self, audio_data, captured_at=None):
+        """Passes a block through the voice activity gate, if enabled, and on to the recognizer."""
+        now = time.monotonic()
+        self._block_times = {'captured_at': now if captured_at is None else captured_at, 'dequeued_at': now}
+        blocks = [audio_data] if self.vad is None else self.vad.process(audio_data)
+        self._advance_clock(len(audio_data), sum(len(block) for block in blocks))
+        for block in blocks:
+            self.process_block(block)
+        if self.vad is None:
+            return
+        if self.vad.utterance_ended:
+            self._finalize()
+
+    def _advance_clock(self, received_bytes, forwarded_bytes):
+        # The blocks forwarded now (pre-roll included) end with the newest audio, so they share one offset.
+        self.stream_seconds += received_bytes / 2 / self.sample_rate
+        offset = self.stream_seconds - self._recognizer_audio - forwarded_bytes / 2 / self.sample_rate
+        if not self._utterance_open:
+            # No pending words can refer to older recognizer time.
+            del self._clock_offsets[:-1]
+        if abs(offset - self._clock_offsets[-1][1]) > 1e-6:
+            self._clock_offsets.append((self._recognizer_audio, offset))
+
+    def _finalize(self):
+        """Delivers whatever the recognizer still holds as a final caption and resets it."""
+        self._utterance_open = False
+        self.partial_gate.reset()
+        self._deliver_result(self.decoder.final(self.recognizer.FinalResult()))
+
+    def flush(self):
+        """Delivers everything still pending, e.g. at the end of a file."""
+        self._finalize()
+        if self.translation_stage:
+            self.translation_stage.drain()
+
+    def _report_skipped_audio(self):
+        """Closes the current utterance and shows a marker if the audio buffer skipped audio (except drop_oldest)."""
+        skipped = self.audio_queue.take_skipped_seconds()
+        self.stream_seconds += skipped
+        if skipped and self.audio_queue.policy in ("skip_to_live", "block"):
+            self._finalize()
+            self._deliver(f"[skipped {skipped:.1f} s]", raw=True)
+
+    def run(self):
+        """
+        Consumes the audio queue until the stop event is set. If the model cannot
+        be loaded, audio is discarded until reload() brings up a working one.
+        """
+        if self.recognizer is None:
+            self.load()
+        while not self.stop_event.is_set():
+            try:
+                captured_at, audio_data = self.audio_queue.get_timed(timeout=1)
+            except queue.Empty:
+                captured_at, audio_data = None, None
+            if self._pending_swap is not None:
+                self._apply_pending_swap()
+            if audio_data is None:
+                continue
+            if self.recognizer is not None:
+                self._report_skipped_audio()
+                self.feed(audio_data, captured_at)
+            self.blocks_received += 1
+
+    def start(self):
+        """Runs the engine on a daemon thread."""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self.stop_event.set()
+        for key in self._held_models.values():
+            model_registry.release(key)
+        self._held_models.clear()
+
+    def transcribe_stream(self, stream, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Transcribes a file-like object of raw 16-bit mono PCM as fast as it can be read.
+        Captions are emitted to the caption queue; returns False if the model failed to load.
+        """
+        if self.recognizer is None and not self.load():
+            return False
+        bytes_per_block = int(block_size) * 2
+        while not self.stop_event.is_set():
+            audio_data = stream.read(bytes_per_block)
+            if not audio_data:
+                break
+            if self._pending_swap is not None:
+                self._apply_pending_swap()
+            self.feed(audio_data)
+        self.flush()
+        return True
+
+
+def open_audio(path, sample_rate=SAMPLE_RATE):
+    """
+    Opens a WAV file, a raw PCM file or stdin ("-") for reading.
+    Returns (stream, sample_rate, closer).
+    """
+    if path == "-":
+        return sys.stdin.buffer, sample_rate, lambda: None
+
+    f = open(path, 'rb')
+    header = f.read(4)
+    f.seek(0)
+    if header != b"RIFF":
+        return f, sample_rate, f.close
+
+    wav = wave.open(f, 'rb')
+    if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+        wav.close()
+        f.close()
+        raise ValueError(f"'{path}' must be 16-bit mono PCM.")
+
+    class _WavStream:
+        def read(self, n):
+            return wav.readframes(n // 2)
+
+    def close():
+        wav.close()
+        f.close()
+
+    return _WavStream(), wav.getframerate(), close
+
+
+def load_settings_file(path):
+    """Loads a LiveScript settings.json if it exists, otherwise returns an empty dict."""
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"Error loading settings file: {e}. Using defaults.", file=sys.stderr)
+        return {}
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m engine",
+                                     description="Transcribe a WAV/raw PCM file or stdin without the caption overlay.")
+    parser.add_argument("input", help="WAV file, raw 16-bit mono PCM file, or '-' for raw PCM on stdin")
+    parser.add_argument("--settings", default="settings.json", help="settings file to read (default: settings.json)")
+    parser.add_argument("--model", help="Vosk model directory (overrides settings)")
+    parser.add_argument("--block-size", type=int, help="samples per recognizer block (overrides settings)")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="sample rate of raw PCM input")
+    parser.add_argument("--translate-to", help="enable translation into this language")
+    parser.add_argument("--backend", choices=["ArgosTranslate", "MarianMT"], help="translation backend")
+    parser.add_argument("--partials", action="store_true", help="also print partial results")
+    parser.add_argument("--latency", action="store_true", help="print per-stage latency percentiles at the end")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    parser.add_argument("--subtitles", help="also write timed subtitles to this .srt, .vtt or .jsonl file")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+
+    settings = load_settings_file(args.settings)
+    if args.model:
+        settings['model_path'] = args.model
+    if args.block_size:
+        settings['block_size'] = args.block_size
+    if args.translate_to:
+        settings['translation_enabled'] = True
+        settings['translation_target_language'] = args.translate_to
+    if args.backend:
+        settings['translation_backend'] = args.backend
+
+    try:
+        stream, sample_rate, close = open_audio(args.input, args.sample_rate)
+    except (IOError, ValueError, wave.Error) as e:
+        print(f"Could not open audio: {e}", file=sys.stderr)
+        return 1
+
+    subtitle_writer = None
+    if args.subtitles:
+        try:
+            subtitle_writer = SubtitleWriter(args.subtitles, rotate_minutes=settings.get('subtitle_rotate_minutes', 0))
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+
+    engine = TranscriptionEngine(settings, sample_rate)
+    metrics_server = None
+    if args.metrics_port:
+        metrics_server = MetricsServer(args.metrics_port)
+        metrics_server.attach(engine)
+        metrics_server.start()
+    result = {}
+
+    def worker():
+        try:
+            result['ok'] = engine.transcribe_stream(stream, settings.get('block_size', DEFAULT_BLOCK_SIZE))
+        finally:
+            engine.caption_queue.put(None)
+
+    started = time.time()
+    worker_thread = threading.Thread(target=worker, daemon=True)
+    worker_thread.start()
+    try:
+        while True:
+            text = engine.caption_queue.get()
+            if text is None:
+                break
+            if args.partials or not text.startswith(PARTIAL_PREFIX):
+                print(text, flush=True)
+            if subtitle_writer:
+                subtitle_writer.write(text)
+    except KeyboardInterrupt:
+        engine.stop()
+        worker_thread.join()
+    finally:
+        close()
+        if metrics_server:
+            metrics_server.stop()
+        if subtitle_writer:
+            subtitle_writer.close()
+    print(f"Finished in {time.time() - started:.2f}s.", file=sys.stderr)
+    if args.latency:
+        print(engine.latency.format_summary(), file=sys.stderr)
+    return 0 if result.get('ok', True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Latency and throughput measurements for the caption pipeline."""
+import collections
+import os
+import sys
+import threading
+import time
+
+# --- Constants ---
+# Stages a caption passes through, in order. Each is measured between two timestamps on the Caption.
+LATENCY_STAGES = (
+    ("audio_queue", "captured_at", "dequeued_at"),
+    ("recognition", "dequeued_at", "recognized_at"),
+    ("translation", "recognized_at", "translated_at"),
+    ("display", "queued_at", "displayed_at"),
+    ("end_to_end", "captured_at", "displayed_at"),
+)
+DEFAULT_WINDOW = 1000
+# Histogram bucket upper bounds in seconds, for the metrics endpoint.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_METRICS_PORT = 9464
+METRICS_PREFIX = "livescript_"
+
+
+def escape_label_value(value):
+    """Escapes a label value for the Prometheus text format (backslash, double quote, newline)."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def percentile(ordered, fraction):
+    """Returns the value at `fraction` of an already sorted, non-empty list."""
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class LatencyTracker:
+    """
+    Keeps the most recent `window` latency samples per pipeline stage.
+
+    Timestamps are time.monotonic() values recorded on each Caption as it moves
+    from audio capture through recognition, translation and the caption queue
+    to the screen.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self._samples = {name: collections.deque(maxlen=window) for name, _, _ in LATENCY_STAGES}
+        # Cumulative since startup, unlike the rolling samples: [bucket counts..., count, sum].
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, collections.deque(maxlen=self.window)).append(seconds)
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+
+    def histograms(self):
+        """Returns {stage: (cumulative bucket counts, count, sum)} for every stage recorded since startup."""
+        with self._lock:
+            return {stage: (h[:len(LATENCY_BUCKETS)], h[-2], h[-1]) for stage, h in self._histograms.items()}
+
+    def record_caption(self, caption, stages=None):
+        """Records the given stages (default: all) whose start and end timestamps are known for this caption."""
+        for name, start_attr, end_attr in LATENCY_STAGES:
+            if stages is not None and name not in stages:
+                continue
+            start, end = getattr(caption, start_attr, None), getattr(caption, end_attr, None)
+            if start is not None and end is not None:
+                self.record(name, end - start)
+
+    def percentiles(self, stage):
+        """Returns count and p50/p95/p99 in seconds for a stage, or None if it has no samples."""
+        with self._lock:
+            ordered = sorted(self._samples.get(stage, ()))
+        if not ordered:
+            return None
+        return {"count": len(ordered), "p50": percentile(ordered, 0.50), "p95": percentile(ordered, 0.95),
+                "p99": percentile(ordered, 0.99)}
+
+    def summary(self):
+        return {stage: stats for stage in list(self._samples) for stats in [self.percentiles(stage)] if stats}
+
+    def format_summary(self):
+        lines = []
+        for stage, stats in self.summary().items():
+            lines.append(f"{stage:<12} p50 {stats['p50'] * 1000:7.0f} ms   p95 {stats['p95'] * 1000:7.0f} ms   "
+                         f"p99 {stats['p99'] * 1000:7.0f} ms   (n={stats['count']})")
+        return "\n".join(lines) if lines else "No captions measured yet."
+
+    def reset(self):
+        with self._lock:
+            for samples in self._samples.values():
+                samples.clear()
+            self._histograms.clear()
+
+
+class BehindAlarm:
+    """Prints a warning, at most once per `interval` seconds, when captions lag more than `threshold` seconds."""
+
+    def __init__(self, threshold, interval=30.0):
+        self.threshold = threshold
+        self.interval = interval
+        self._last_warning = 0.0
+
+    def check(self, lag):
+        if not self.threshold or lag <= self.threshold:
+            return False
+        now = time.monotonic()
+        if now - self._last_warning >= self.interval:
+            self._last_warning = now
+            print(f"Warning: captions are {lag:.1f}s behind live audio. Consider a larger block size.")
+        return True
+
+
+# Shared by the engine and the caption window so the overlay can report the whole pipeline.
+latency_tracker = LatencyTracker()
+
+
+def resident_memory_bytes():
+    """Returns the current RSS of this process, or None where it cannot be read without extra packages."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS, but the best the stdlib offers on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MetricsServer:
+    """
+    Serves pipeline metrics in the Prometheus text format on http://host:port/metrics.
+
+    Nothing here runs unless the server is started: with 'metrics_enabled' off,
+    from_settings() returns None and http.server is never imported. Each engine
+    is attached once its recognizer thread creates it; with several audio
+    sources, their metrics carry a `stream` label.
+    """
+
+    def __init__(self, port=DEFAULT_METRICS_PORT, host="127.0.0.1", tracker=latency_tracker):
+        self.port = port
+        self.host = host
+        self.tracker = tracker
+        self.engines = []
+        self._httpd = None
+        self._thread = None
+        self._last_scrape = {}
+
+    @classmethod
+    def from_settings(cls, settings):
+        if not settings.get('metrics_enabled', False):
+            return None
+        return cls(settings.get('metrics_port', DEFAULT_METRICS_PORT), settings.get('metrics_host', "127.0.0.1"))
+
+    def attach(self, engine):
+        if engine not in self.engines:
+            self.engines.append(engine)
+
+    def _blocks_per_second(self, engine):
+        # Averaged over the time since the previous scrape, so it follows the scrape interval.
+        now, blocks = time.monotonic(), engine.blocks_processed
+        previous, self._last_scrape[id(engine)] = self._last_scrape.get(id(engine)), (now, blocks)
+        if previous is None or now <= previous[0]:
+            return 0.0
+        return (blocks - previous[1]) / (now - previous[0])
+
+    def render(self):
+        """Returns the current metrics as Prometheus exposition text."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRICS_PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+            for suffix, labels, value in samples:
+                label_text = "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels) + "}" if labels else ""
+                lines.append(f"{METRICS_PREFIX}{name}{suffix}{label_text} {value}")
+
+        engines = list(self.engines)
+        if engines:
+            def per_stream(value):
+                return [("", [("stream", engine.source or "default")], value(engine)) for engine in engines]
+
+            metric("queue_depth", "gauge", "Items waiting in each pipeline queue.", [
+                ("", [("stream", engine.source or "default"), ("queue", name)], depth)
+                for engine in engines
+                for name, depth in (("audio_queue", engine.audio_queue.qsize()),
+                                    ("caption_queue", engine.caption_queue.qsize()),
+                                    ("translation", engine.translation_stage.pending if engine.translation_stage else 0))
+            ])
+            metric("blocks_processed_total", "counter", "Audio blocks fed to the recognizer.",
+                   per_stream(lambda engine: engine.blocks_processed))
+            metric("blocks_per_second", "gauge", "Audio blocks recognized per second since the last scrape.",
+                   per_stream(lambda engine: round(self._blocks_per_second(engine), 3)))
+            metric("audio_seconds_total", "counter", "Seconds of audio fed to the recognizer.",
+                   per_stream(lambda engine: round(engine.audio_seconds, 3)))
+            metric("recognizer_real_time_factor", "gauge",
+                   "Recognizer time divided by audio time since startup; above 1 means falling behind.",
+                   per_stream(lambda engine: round(engine.recognizer_seconds / engine.audio_seconds, 4)
+                              if engine.audio_seconds else 0))
+            sized = [engine for engine in engines if engine.block_sizer is not None]
+            if sized:
+                metric("block_size_samples", "gauge", "Samples per captured audio block.",
+                       [("", [("stream", engine.source or "default")], engine.block_sizer.block_size)
+                        for engine in sized])
+            metric("dropped_blocks_total", "counter", "Audio blocks discarded by the overload policy.",
+                   per_stream(lambda engine: getattr(engine.audio_queue, 'dropped_blocks', 0)))
+            metric("dropped_audio_seconds_total", "counter", "Seconds of audio discarded by the overload policy.",
+                   per_stream(lambda engine: round(getattr(engine.audio_queue, 'dropped_seconds', 0.0), 3)))
+
+        samples = []
+        for stage_name, (buckets, count, total) in self.tracker.histograms().items():
+            labels = [("stage", stage_name)]
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                samples.append(("_bucket", labels + [("le", bound)], bucket_count))
+            samples.append(("_bucket", labels + [("le", "+Inf")], count))
+            samples.append(("_sum", labels, round(total, 6)))
+            samples.append(("_count", labels, count))
+        metric("stage_latency_seconds", "histogram", "Caption latency per pipeline stage.", samples)
+
+        rss = resident_memory_bytes()
+        if rss is not None:
+            metric("resident_memory_bytes", "gauge", "Resident set size of the process.", [("", [], rss)])
+        return "\n".join(lines) + "\n"
+
+    def start(self):
+        """Starts serving on a daemon thread. Returns False (after printing why) if the port is unavailable."""
+        import http.server
+
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = server.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._httpd = http.server.ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            print(f"Metrics endpoint disabled: cannot listen on {self.host}:{self.port} ({e})")
+            return False
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+        return True
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,172 @@
+"""Process-wide registry of loaded speech recognition and translation models."""
+# vosk, argostranslate, transformers and torch are imported by the loaders that need them,
+# as in translator.py, so importing this module stays cheap.
+import collections
+import os
+import sys
+import threading
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process and hands the same object to every caller.
+
+    The recognizer, the settings window's status checks and any extra streams
+    all ask the registry, so opening Settings no longer loads a second copy of
+    a model that is already in memory. Concurrent requests for a model that is
+    still loading wait for that load instead of starting another. Failed loads
+    are not remembered, so a model downloaded later is picked up. Engines
+    acquire() the models they run on and release() them when they stop or
+    switch. Released models stay loaded for the next engine; only
+    discard_unused() frees one, which engines call for the model they switched
+    away from. warm() holds what it preloads until an engine acquires it.
+    """
+
+    def __init__(self):
+        self._models = {}
+        self._loading = {}
+        self._users = collections.Counter()
+        # Keys warm() acquired that no engine has taken over yet.
+        self._warmed = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        """Returns the model stored under `key`, calling `load()` to create it if needed."""
+        while True:
+            with self._lock:
+                if key in self._models:
+                    return self._models[key]
+                event = self._loading.get(key)
+                if event is None:
+                    event = self._loading[key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            model = load()
+            if model is not None:
+                with self._lock:
+                    self._models[key] = model
+            return model
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+
+    def loaded(self, key):
+        with self._lock:
+            return key in self._models
+
+    def discard(self, key):
+        """Forgets a model so its memory is freed once the last user lets go of it."""
+        if key is None:
+            return
+        with self._lock:
+            self._models.pop(key, None)
+
+    def acquire(self, key):
+        """Marks a model as in use, so discard_unused() keeps it. Takes over the hold warm() left on it."""
+        if key is None:
+            return
+        with self._lock:
+            if key in self._warmed:
+                self._warmed.discard(key)
+            else:
+                self._users[key] += 1
+
+    def release(self, key):
+        """Undoes one acquire(). The model stays loaded until discard_unused() is called for it."""
+        if key is None:
+            return
+        with self._lock:
+            self._users[key] -= 1
+            if self._users[key] <= 0:
+                del self._users[key]
+
+    def discard_unused(self, key):
+        """Forgets a model unless something has acquired it, e.g. one only loaded for a one-off check."""
+        if key is None:
+            return
+        with self._lock:
+            if not self._users[key]:
+                self._models.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._models)
+
+    def vosk_model(self, model_path):
+        """Returns the vosk.Model for a model directory. Raises FileNotFoundError if it does not exist."""
+        if not os.path.isdir(model_path):
+            raise FileNotFoundError(f"Model path '{model_path}' not found. Please select a valid model in settings.")
+
+        def load():
+            import vosk
+            return vosk.Model(model_path)
+
+        return self.get(vosk_key(model_path), load)
+
+    def marian_model(self, model_name, quantize=False):
+        """Returns (tokenizer, model) for a Helsinki-NLP MarianMT model, in eval mode and optionally int8."""
+
+        def load():
+            import torch
+            from transformers import MarianMTModel, MarianTokenizer
+            # from_pretrained checks the local cache first, so this does not re-download.
+            tokenizer = MarianTokenizer.from_pretrained(model_name)
+            model = MarianMTModel.from_pretrained(model_name)
+            model.eval()
+            if quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            return tokenizer, model
+
+        return self.get(marian_key(model_name, quantize), load)
+
+    def argos_translation(self, from_lang, to_lang):
+        """Returns the Argos translation between two installed languages, or None if there is none."""
+        return self.get(argos_key(from_lang.name, to_lang.name), lambda: from_lang.get_translation(to_lang))
+
+    def _hold_for_engine(self, key):
+        with self._lock:
+            if key is None or key in self._warmed or key not in self._models:
+                return
+            self._warmed.add(key)
+            self._users[key] += 1
+
+    def warm(self, settings):
+        """
+        Loads the models `settings` will need on a background thread and holds
+        them until an engine acquires them. Returns the thread.
+        """
+
+        def load():
+            # Imported here because translator imports this module.
+            from translator import get_translator
+            try:
+                # Translator first: the recognizer thread starts on the Vosk model at the same time.
+                self._hold_for_engine(getattr(get_translator(settings), 'registry_key', None))
+                if settings.get('model_path'):
+                    self.vosk_model(settings['model_path'])
+                    self._hold_for_engine(vosk_key(settings['model_path']))
+            except Exception as e:
+                print(f"Could not preload models: {e}", file=sys.stderr)
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        return thread
+
+
+def vosk_key(model_path):
+    return "vosk", os.path.abspath(model_path)
+
+
+def marian_key(model_name, quantize=False):
+    return "marian", model_name, bool(quantize)
+
+
+def argos_key(from_name, to_name):
+    return "argos", from_name, to_name
+
+
+# Shared by every engine, translator and settings window in the process.
+model_registry = ModelRegistry()
@@ -0,0 +1,343 @@
+"""Caption server: many clients stream audio in and get captions back from one process.
+
+    python -m server --port 2700                  # raw TCP
+    python -m server --port 2700 --websocket      # WebSocket (needs the `websockets` package)
+
+A client sends 16-bit mono PCM and receives one JSON object per line (TCP) or
+per text message (WebSocket): ``{"type": "partial"|"final", "text": ...}``,
+then ``{"type": "eof"}`` once its audio has ended and everything is flushed.
+Before the audio it may configure the session with one JSON object, e.g.
+``{"sample_rate": 8000, "translate_to": "Spanish", "partials": false}``: as
+a text message over WebSocket, or over TCP as a line starting with the
+``LIVESCRIPT-CONFIG `` prefix (raw PCM can begin with any byte, so the
+prefix is what marks it). WebSocket clients end with ``{"eof": true}``.
+
+Every connection has its own recognizer on the one shared Vosk model (and
+shared translation model). The blocking AcceptWaveform calls run on a thread
+pool so the event loop stays responsive. Audio is read only as fast as it is
+recognized, which pushes back on fast senders; partials waiting for a slow
+reader are coalesced, and a reader that falls too far behind on finals is
+disconnected.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import sys
+
+from engine import (DEFAULT_BLOCK_SIZE, DEFAULT_MODEL_PATH, PARTIAL_PREFIX, SAMPLE_RATE, TranscriptionEngine,
+                    load_settings_file)
+from metrics import MetricsServer
+from models import model_registry
+
+# --- Constants ---
+DEFAULT_PORT = 2700
+DEFAULT_MAX_CONNECTIONS = 16
+MAX_PENDING_FINALS = 256
+MAX_CONFIG_BYTES = 4096
+CONFIG_MAGIC = b"LIVESCRIPT-CONFIG "
+
+
+class _OutboxQueue:
+    """Stands in for the engine's caption queue and hands captions to the session on its event loop."""
+
+    def __init__(self, session, loop):
+        self.session = session
+        self.loop = loop
+
+    def put(self, caption):
+        # Called from the recognizer and translation threads.
+        self.loop.call_soon_threadsafe(self.session.enqueue, caption)
+
+    def qsize(self):
+        return len(self.session.outbox)
+
+
+class CaptionSession:
+    """One client's recognizer, fed from the event loop through the shared thread pool."""
+
+    def __init__(self, settings, sample_rate, executor, partials=True):
+        self.executor = executor
+        self.partials = partials
+        self.outbox = collections.deque()
+        self.overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._remainder = b""
+        self.engine = TranscriptionEngine(settings, sample_rate, caption_queue=_OutboxQueue(self, self._loop))
+
+    @classmethod
+    def from_config(cls, settings, config, executor):
+        """
+        Builds a session from the server settings and the client's optional config message.
+        Raises ValueError if the config is not a JSON object with valid values.
+        """
+        if not isinstance(config, dict):
+            raise ValueError("config must be a JSON object")
+        sample_rate = config.get('sample_rate', SAMPLE_RATE)
+        if isinstance(sample_rate, bool) or not isinstance(sample_rate, int) or sample_rate <= 0:
+            raise ValueError("sample_rate must be a positive integer")
+        if config.get('translate_to') is not None and not isinstance(config['translate_to'], str):
+            raise ValueError("translate_to must be a language name")
+        settings = dict(settings)
+        if config.get('translate_to'):
+            settings['translation_enabled'] = True
+            settings['translation_target_language'] = config['translate_to']
+        elif 'translate_to' in config:
+            settings['translation_enabled'] = False
+        return cls(settings, sample_rate, executor, bool(config.get('partials', True)))
+
+    async def _run(self, function, *args):
+        return await self._loop.run_in_executor(self.executor, function, *args)
+
+    async def start(self):
+        """Creates the recognizer (the model itself is shared). Returns False if the model failed to load."""
+        return await self._run(self.engine.load)
+
+    async def feed(self, data):
+        # Vosk needs whole 16-bit samples; a TCP read can end halfway through one.
+        data = self._remainder + data
+        usable = len(data) - len(data) % 2
+        self._remainder = data[usable:]
+        if usable:
+            await self._run(self.engine.feed, data[:usable])
+
+    async def finish(self):
+        """Flushes the recognizer and translator and queues the end-of-stream message."""
+        await self._run(self.engine.flush)
+        self._loop.call_soon(self.enqueue, None)
+
+    def close(self):
+        self._closed = True
+        self.engine.stop()
+        self._ready.set()
+
+    def enqueue(self, caption):
+        """Queues a caption for sending; None marks the end of the stream."""
+        if caption is not None and caption.startswith(PARTIAL_PREFIX):
+            if not self.partials:
+                return
+            if self.outbox and self.outbox[-1] is not None and self.outbox[-1].startswith(PARTIAL_PREFIX):
+                # The reader has not caught up; only the newest partial is worth sending.
+                self.outbox[-1] = caption
+                self._ready.set()
+                return
+        self.outbox.append(caption)
+        if len(self.outbox) > MAX_PENDING_FINALS:
+            self.overflowed = True
+            self.close()
+        self._ready.set()
+
+    async def messages(self):
+        """Yields outgoing JSON messages until the stream ends or the session is closed."""
+        while not self._closed:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.outbox and not self._closed:
+                caption = self.outbox.popleft()
+                if caption is None:
+                    yield json.dumps({"type": "eof"})
+                    return
+                if caption.startswith(PARTIAL_PREFIX):
+                    yield json.dumps({"type": "partial", "text": caption[len(PARTIAL_PREFIX):]})
+                else:
+                    yield json.dumps({"type": "final", "text": str(caption)})
+        if self.overflowed:
+            yield json.dumps({"type": "error", "text": "client is not reading captions fast enough"})
+
+
+class CaptionServer:
+    """Accepts audio connections over raw TCP or WebSocket, up to `max_connections` at once."""
+
+    def __init__(self, settings, host="127.0.0.1", port=DEFAULT_PORT, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 workers=None, block_size=DEFAULT_BLOCK_SIZE):
+        self.settings = settings
+        self.host = host
+        self.port = port
+        self.max_connections = max(1, int(max_connections))
+        self.block_bytes = int(block_size) * 2
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count(),
+                                                              thread_name_prefix="recognizer")
+        self.active = 0
+        self.metrics_server = None
+
+    def _admit(self):
+        if self.active >= self.max_connections:
+            return False
+        self.active += 1
+        return True
+
+    async def _serve_session(self, session, receive, send, initial=b""):
+        """
+        Runs one connection: `receive()` returns PCM bytes (b"" at the end); `send(text)` writes a message.
+        `initial` is audio already read while looking for a config message.
+        """
+        if not await session.start():
+            await send(json.dumps({"type": "error", "text": "speech model could not be loaded"}))
+            return
+        if self.metrics_server:
+            self.metrics_server.attach(session.engine)
+
+        async def pump_audio():
+            try:
+                if initial:
+                    await session.feed(initial)
+                while True:
+                    data = await receive()
+                    if not data:
+                        break
+                    await session.feed(data)
+                await session.finish()
+            except Exception as e:
+                # The client went away mid-stream; stop sending too.
+                print(f"Connection closed: {e}", file=sys.stderr)
+                session.close()
+
+        async def pump_captions():
+            async for message in session.messages():
+                await send(message)
+
+        reader = asyncio.ensure_future(pump_audio())
+        try:
+            await pump_captions()
+        finally:
+            reader.cancel()
+            session.close()
+            if self.metrics_server and session.engine in self.metrics_server.engines:
+                self.metrics_server.engines.remove(session.engine)
+
+    async def handle_tcp(self, reader, writer):
+        if not self._admit():
+            writer.write(json.dumps({"type": "error", "text": "server is at its connection limit"}).encode() + b"\n")
+            await writer.drain()
+            writer.close()
+            return
+        try:
+            config = {}
+            try:
+                first = await reader.readexactly(len(CONFIG_MAGIC))
+            except asyncio.IncompleteReadError as e:
+                # Less audio than the prefix is long; still a valid (short) stream.
+                first = e.partial
+            try:
+                if first == CONFIG_MAGIC:
+                    line = await reader.readuntil(b"\n")
+                    if len(line) > MAX_CONFIG_BYTES:
+                        raise ValueError("config line too long")
+                    config, first = json.loads(line), b""
+                session = CaptionSession.from_config(self.settings, config, self.executor)
+            except ValueError as e:
+                writer.write(json.dumps({"type": "error", "text": f"invalid config: {e}"}).encode() + b"\n")
+                await writer.drain()
+                return
+
+            async def receive():
+                return await reader.read(self.block_bytes)
+
+            async def send(message):
+                writer.write(message.encode("utf-8") + b"\n")
+                # Waits while the client's receive window is full.
+                await writer.drain()
+
+            await self._serve_session(session, receive, send, first)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            print(f"Connection closed: {e}", file=sys.stderr)
+        finally:
+            self.active -= 1
+            writer.close()
+
+    async def handle_websocket(self, websocket, path=None):
+        if not self._admit():
+            await websocket.close(1013, "server is at its connection limit")
+            return
+        try:
+            config, first = {}, await websocket.recv()
+            try:
+                if isinstance(first, str):
+                    config, first = json.loads(first), b""
+                session = CaptionSession.from_config(self.settings, config, self.executor)
+            except ValueError as e:
+                await websocket.send(json.dumps({"type": "error", "text": f"invalid config: {e}"}))
+                return
+
+            async def receive():
+                message = await websocket.recv()
+                if isinstance(message, str):
+                    return b"" if json.loads(message).get("eof") else await receive()
+                return message
+
+            await self._serve_session(session, receive, websocket.send, first)
+        except ValueError as e:
+            print(f"Connection closed: {e}", file=sys.stderr)
+        finally:
+            self.active -= 1
+
+    async def serve(self, websocket=False):
+        scheme = "ws" if websocket else "tcp"
+        banner = (f"Serving captions on {scheme}://{self.host}:{self.port} "
+                  f"(up to {self.max_connections} connections).")
+        if websocket:
+            try:
+                import websockets
+            except ImportError:
+                raise RuntimeError("WebSocket mode needs the 'websockets' package: pip install websockets")
+            async with websockets.serve(self.handle_websocket, self.host, self.port,
+                                        max_size=max(self.block_bytes * 4, 1 << 20)):
+                print(banner, file=sys.stderr)
+                await asyncio.Future()
+        else:
+            server = await asyncio.start_server(self.handle_tcp, self.host, self.port)
+            print(banner, file=sys.stderr)
+            async with server:
+                await server.serve_forever()
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m server", description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--websocket", action="store_true", help="speak WebSocket instead of raw TCP")
+    parser.add_argument("--settings", default="settings.json", help="settings file to read (default: settings.json)")
+    parser.add_argument("--model", help="Vosk model directory (overrides settings)")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS)
+    parser.add_argument("--workers", type=int, help="recognizer threads (default: one per CPU)")
+    parser.add_argument("--translate-to", help="translate every session into this language unless it asks otherwise")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port while running")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    settings = load_settings_file(args.settings)
+    settings.setdefault('model_path', DEFAULT_MODEL_PATH)
+    if args.model:
+        settings['model_path'] = args.model
+    if args.translate_to:
+        settings['translation_enabled'] = True
+        settings['translation_target_language'] = args.translate_to
+
+    server = CaptionServer(settings, args.host, args.port, args.max_connections, args.workers,
+                           settings.get('block_size', DEFAULT_BLOCK_SIZE))
+    if args.metrics_port:
+        server.metrics_server = MetricsServer(args.metrics_port)
+        server.metrics_server.start()
+    # Load the shared models before the first client arrives, and keep them
+    # loaded while the server runs rather than only while a client is connected.
+    model_registry.warm(settings).join()
+    for key in model_registry.keys():
+        model_registry.acquire(key)
+    try:
+        asyncio.run(server.serve(args.websocket))
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
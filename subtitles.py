@@ -0,0 +1,187 @@
+"""Streams final captions to SRT, WebVTT or JSONL subtitle files as they are recognized."""
+import json
+import os
+import queue
+import sys
+import textwrap
+import threading
+import time
+
+# --- Constants ---
+PARTIAL_PREFIX = "... "
+SUBTITLE_FORMATS = ("srt", "vtt", "jsonl")
+MAX_CUE_SECONDS = 6.0
+MAX_CUE_CHARS = 84
+LINE_CHARS = 42
+TRANSLATED_SUFFIX = ".translated"
+
+
+def format_timestamp(seconds, separator=","):
+    """Formats seconds as HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)."""
+    millis = int(round(max(0.0, seconds) * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{millis:03d}"
+
+
+def split_cues(words, max_seconds=MAX_CUE_SECONDS, max_chars=MAX_CUE_CHARS):
+    """Groups (word, start, end) tuples into (start, end, text) cues no longer than the limits allow."""
+    cue = []
+    for word in words:
+        if cue:
+            text = " ".join(w[0] for w in cue + [word])
+            if word[2] - cue[0][1] > max_seconds or len(text) > max_chars:
+                yield cue[0][1], cue[-1][2], " ".join(w[0] for w in cue)
+                cue = []
+        cue.append(word)
+    if cue:
+        yield cue[0][1], cue[-1][2], " ".join(w[0] for w in cue)
+
+
+class _TrackFile:
+    """
+    One subtitle track on disk. Each cue is written and flushed as it arrives;
+    with `rotate_seconds` set, a new numbered file is started for every that
+    many seconds of stream time (talk.srt becomes talk.001.srt, talk.002.srt...).
+    A late cue for an earlier part (several sources feed one writer, so cues
+    can cross a boundary out of order) is appended to that part.
+    """
+
+    def __init__(self, path, fmt, rotate_seconds=0):
+        self.path = path
+        self.fmt = fmt
+        self.rotate_seconds = rotate_seconds
+        self._file = None
+        self._part = None
+        self._cue_number = 0
+        # Cues written so far to each part this session; a part seen before is reopened for appending.
+        self._cue_counts = {}
+
+    def _part_path(self, part):
+        if part is None:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}.{part + 1:03d}{ext}"
+
+    def _open_for(self, start):
+        part = int(start // self.rotate_seconds) if self.rotate_seconds else None
+        if self._file is not None and part == self._part:
+            return
+        self.close()
+        resumed = part in self._cue_counts
+        self._part = part
+        self._cue_number = self._cue_counts.get(part, 0)
+        self._file = open(self._part_path(part), 'a' if resumed else 'w', encoding='utf-8')
+        if self.fmt == "vtt" and not resumed:
+            self._file.write("WEBVTT\n\n")
+
+    def write_cue(self, start, end, text):
+        self._open_for(start)
+        self._cue_number += 1
+        lines = "\n".join(textwrap.wrap(text, LINE_CHARS)) or text
+        if self.fmt == "vtt":
+            self._file.write(f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{lines}\n\n")
+        else:
+            self._file.write(f"{self._cue_number}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{lines}\n\n")
+        self._file.flush()
+
+    def write_record(self, start, record):
+        self._open_for(start)
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._cue_counts[self._part] = self._cue_number
+            self._file.close()
+            self._file = None
+
+
+class SubtitleWriter:
+    """
+    Writes final captions as subtitles, using the word timings the engine attaches.
+
+    SRT and WebVTT cues are split at `max_cue_seconds` / `max_cue_chars` on word
+    boundaries. Translated captions put the recognized text in the main file and
+    the translation, one cue per utterance, in a second track next to it
+    (talk.translated.srt). JSONL gets one line per utterance with both texts and
+    the word timings. Nothing is kept in memory once it has been written.
+    Times are seconds of stream time, so audio skipped by VAD or overload
+    still moves the clock. Captions without timings (e.g. skip markers) are left out.
+    """
+
+    def __init__(self, path, fmt=None, rotate_minutes=0, max_cue_seconds=MAX_CUE_SECONDS,
+                 max_cue_chars=MAX_CUE_CHARS):
+        # The path may contain strftime fields, e.g. captions-%Y%m%d-%H%M.srt, so sessions do not overwrite each other.
+        path = time.strftime(path)
+        fmt = (fmt or os.path.splitext(path)[1].lstrip(".") or "srt").lower()
+        if fmt not in SUBTITLE_FORMATS:
+            raise ValueError(f"Unknown subtitle format '{fmt}'; expected one of {', '.join(SUBTITLE_FORMATS)}.")
+        self.fmt = fmt
+        self.max_cue_seconds = max_cue_seconds
+        self.max_cue_chars = max_cue_chars
+        rotate_seconds = float(rotate_minutes or 0) * 60.0
+        self.track = _TrackFile(path, fmt, rotate_seconds)
+        root, ext = os.path.splitext(path)
+        self.translated_track = _TrackFile(root + TRANSLATED_SUFFIX + ext, fmt, rotate_seconds)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings):
+        if not settings.get('subtitle_path'):
+            return None
+        return cls(settings['subtitle_path'], settings.get('subtitle_format') or None,
+                   settings.get('subtitle_rotate_minutes', 0))
+
+    def write(self, caption):
+        """Writes one caption if it is a final with timings; anything else is ignored."""
+        if caption.startswith(PARTIAL_PREFIX) or getattr(caption, 'start', None) is None:
+            return
+        original = getattr(caption, 'original', None)
+        source = getattr(caption, 'source', None)
+        prefix = f"{source}: " if source else ""
+        words = caption.words or [(str(caption), caption.start, caption.end)]
+
+        with self._lock:
+            if self.fmt == "jsonl":
+                record = {"start": round(caption.start, 3), "end": round(caption.end, 3), "text": str(caption)}
+                if original is not None:
+                    record["original"] = original
+                if source:
+                    record["source"] = source
+                record["words"] = [{"word": w, "start": round(s, 3), "end": round(e, 3)} for w, s, e in words]
+                self.track.write_record(caption.start, record)
+                return
+            # Word timings belong to the recognized text, which is the original when translated.
+            for start, end, text in split_cues(words, self.max_cue_seconds, self.max_cue_chars):
+                self.track.write_cue(start, end, prefix + text)
+            if original is not None:
+                self.translated_track.write_cue(caption.start, caption.end, prefix + caption)
+
+    def close(self):
+        with self._lock:
+            self.track.close()
+            self.translated_track.close()
+
+    def attach(self, broadcaster, stop_event):
+        """Writes everything published on a broadcast.CaptionBroadcaster from a daemon thread until `stop_event` is set."""
+        # Finals must not be dropped, and writing one is quick, so allow a deep backlog.
+        subscription = broadcaster.subscribe("subtitles", max_finals=4096)
+
+        def run():
+            try:
+                while not stop_event.is_set():
+                    try:
+                        self.write(subscription.get(timeout=1.0))
+                    except queue.Empty:
+                        continue
+            except OSError as e:
+                print(f"Subtitle export stopped: {e}", file=sys.stderr)
+            finally:
+                broadcaster.unsubscribe(subscription)
+                self.close()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
@@ -1,23 +1,234 @@
-import argostranslate.package
-import argostranslate.translate
-from transformers import MarianMTModel, MarianTokenizer
+# argostranslate, transformers and torch are imported inside the methods that need them:
+# they take seconds and hundreds of MB to load, and translation is off by default.
+import atexit
+import collections
+import sqlite3
 import threading
+import time
+
+from models import argos_key, marian_key, model_registry
+
+TRANSLATION_CACHE_FILE = "translation_cache.sqlite3"
+DEFAULT_DISK_ENTRIES = 100000
+# Disk writes are committed together, once this many are waiting or this many seconds have passed.
+CACHE_COMMIT_ENTRIES = 64
+CACHE_COMMIT_SECONDS = 5.0
+
+
+# --- Translation Cache ---
+class TranslationCache:
+    """
+    A bounded, thread-safe LRU cache of translations shared by all backends.
+
+    Entries are keyed by (backend, from, to, normalized text). If `path` is set,
+    translations of finals are also written to an SQLite file which is
+    consulted on a memory miss, so the cache survives restarts. Partials are
+    kept in memory only. Disk writes are committed in batches, and the file
+    is trimmed to the `max_disk_entries` most recently written rows.
+    """
+
+    def __init__(self, max_entries=2048, path=None, max_disk_entries=DEFAULT_DISK_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS translations "
+                                 "(backend TEXT, from_lang TEXT, to_lang TEXT, source TEXT, target TEXT, "
+                                 "PRIMARY KEY (backend, from_lang, to_lang, source))")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Could not open translation cache '{path}': {e}")
+                self._db = None
+
+    @staticmethod
+    def make_key(backend, from_lang, to_lang, text):
+        return backend, from_lang, to_lang, " ".join(text.lower().split())
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT target FROM translations WHERE backend=? AND from_lang=? "
+                                           "AND to_lang=? AND source=?", key).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Could not read translation cache: {e}")
+                    row = None
+                if row:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store(key, row[0])
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, persist=True):
+        """Stores a translation. With `persist` False (e.g. for a partial) it is kept in memory only."""
+        with self._lock:
+            self._store(key, value)
+            if self._db is not None and persist:
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)", key + (value,))
+                    self._uncommitted += 1
+                    if (self._uncommitted >= CACHE_COMMIT_ENTRIES
+                            or time.monotonic() - self._last_commit >= CACHE_COMMIT_SECONDS):
+                        self._commit()
+                except sqlite3.Error as e:
+                    print(f"Could not write translation cache: {e}")
+
+    def _commit(self):
+        # Called with the lock held. Replaced rows get a new rowid, so the lowest rowids are the oldest writes.
+        self._db.execute("DELETE FROM translations WHERE rowid IN (SELECT rowid FROM translations ORDER BY rowid "
+                         "LIMIT max(0, (SELECT count(*) FROM translations) - ?))", (self.max_disk_entries,))
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def flush(self):
+        """Commits translations still waiting to be written to disk."""
+        with self._lock:
+            if self._db is not None and self._uncommitted:
+                try:
+                    self._commit()
+                except sqlite3.Error as e:
+                    print(f"Could not write translation cache: {e}")
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "disk_hits": self.disk_hits, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM translations")
+                    self._db.commit()
+                    self._uncommitted = 0
+                except sqlite3.Error as e:
+                    print(f"Could not clear translation cache: {e}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_translation_cache(settings):
+    """Returns the process-wide translation cache, creating it from the settings on first use."""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            path = TRANSLATION_CACHE_FILE if settings.get("translation_cache_persistent") else None
+            _shared_cache = TranslationCache(settings.get("translation_cache_size", 2048), path,
+                                             settings.get("translation_cache_disk_entries", DEFAULT_DISK_ENTRIES))
+            if path:
+                atexit.register(_shared_cache.flush)
+        return _shared_cache
 
 
 # --- Base Translator Class ---
 class BaseTranslator:
     """A base class for all translation backends."""
+    BACKEND = None
+    NOT_READY_TAG = "[No Model]"
+    ERROR_TAG = "[Translation Error]"
 
-    def __init__(self, from_lang_name, to_lang_name, status_callback=None):
+    def __init__(self, from_lang_name, to_lang_name, status_callback=None, cache=None):
         self.from_lang_name = from_lang_name
         self.to_lang_name = to_lang_name
         self.status_callback = status_callback
+        self.cache = cache
         self.is_ready = False
+        # Where the loaded model lives in models.model_registry, once there is one.
+        self.registry_key = None
+        # Cache entries are only shared between translators that would produce the same output.
+        self.cache_backend = self.BACKEND
+
+    def translate(self, text, persist=True):
+        """
+        Translates a given text, consulting the shared cache first.
+        `persist` False keeps the result out of the on-disk cache, e.g. for a partial.
+        """
+        if not self.is_ready:
+            return f"{self.NOT_READY_TAG} {text}"
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.cache_backend, self.from_lang_name, self.to_lang_name, text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            translated = self._translate(text)
+        except Exception as e:
+            print(f"{self.BACKEND} translation error: {e}")
+            return f"{self.ERROR_TAG} {text}"
+
+        if key is not None:
+            self.cache.put(key, translated, persist)
+        return translated
+
+    def translate_batch(self, texts):
+        """Translates several texts at once. Cached texts are skipped; the rest go to the backend together."""
+        if not self.is_ready:
+            return [f"{self.NOT_READY_TAG} {text}" for text in texts]
+
+        results = [None] * len(texts)
+        keys = [None] * len(texts)
+        pending = collections.OrderedDict()  # text -> indexes still needing a translation
+        for i, text in enumerate(texts):
+            if self.cache is not None:
+                keys[i] = self.cache.make_key(self.cache_backend, self.from_lang_name, self.to_lang_name, text)
+                cached = self.cache.get(keys[i])
+                if cached is not None:
+                    results[i] = cached
+                    continue
+            pending.setdefault(text, []).append(i)
 
-    def translate(self, text):
-        """Translates a given text."""
+        if pending:
+            try:
+                translations = self._translate_batch(list(pending))
+            except Exception as e:
+                print(f"{self.BACKEND} batch translation error: {e}")
+                translations = None
+            for n, (text, indexes) in enumerate(pending.items()):
+                translated = translations[n] if translations else f"{self.ERROR_TAG} {text}"
+                for i in indexes:
+                    results[i] = translated
+                if translations and keys[indexes[0]] is not None:
+                    self.cache.put(keys[indexes[0]], translated)
+        return results
+
+    def _translate(self, text):
+        """Translates a given text with the backend. Errors are raised, not returned."""
         raise NotImplementedError
 
+    def _translate_batch(self, texts):
+        """Translates a list of texts. Backends without native batching translate one at a time."""
+        return [self._translate(text) for text in texts]
+
     def check_and_install_model(self):
         """Checks if the required model is installed and downloads it if not."""
         pass
@@ -29,9 +240,11 @@ class BaseTranslator:
 
 class ArgosTranslator(BaseTranslator):
     """Translator using the Argos Translate library (offline)."""
+    BACKEND = "ArgosTranslate"
+    NOT_READY_TAG = "[No Argos Model]"
 
-    def __init__(self, from_lang_name, to_lang_name, status_callback=None):
-        super().__init__(from_lang_name, to_lang_name, status_callback)
+    def __init__(self, from_lang_name, to_lang_name, status_callback=None, cache=None):
+        super().__init__(from_lang_name, to_lang_name, status_callback, cache)
         self.translator = None
         self.from_lang = None
         self.to_lang = None
@@ -39,13 +252,15 @@ class ArgosTranslator(BaseTranslator):
 
     def check_model(self):
         try:
+            import argostranslate.translate
             installed_languages = argostranslate.translate.get_installed_languages()
             self.from_lang = next((lang for lang in installed_languages if lang.name == self.from_lang_name), None)
             self.to_lang = next((lang for lang in installed_languages if lang.name == self.to_lang_name), None)
 
             if self.from_lang and self.to_lang:
-                self.translator = self.from_lang.get_translation(self.to_lang)
+                self.translator = model_registry.argos_translation(self.from_lang, self.to_lang)
                 if self.translator:
+                    self.registry_key = argos_key(self.from_lang_name, self.to_lang_name)
                     self._update_status(f"Argos model for {self.from_lang_name} -> {self.to_lang_name} found.", "green")
                     self.is_ready = True
                 else:
@@ -65,29 +280,37 @@ class ArgosTranslator(BaseTranslator):
             self._update_status(f"Error checking Argos model: {e}", "red")
             self.is_ready = False
 
-    def translate(self, text):
-        if not self.is_ready or not self.translator:
-            return f"[No Argos Model] {text}"
-        try:
-            return self.translator.translate(text)
-        except Exception as e:
-            print(f"Argos translation error: {e}")
-            return f"[Translation Error] {text}"
+    def _translate(self, text):
+        return self.translator.translate(text)
 
 
 class MarianTranslator(BaseTranslator):
     """Translator using Hugging Face MarianMT models (offline)."""
+    BACKEND = "MarianMT"
+    NOT_READY_TAG = "[No MarianMT Model]"
+    ERROR_TAG = "[MarianMT Error]"
     LANG_CODE_MAP = {
         "English": "en", "French": "fr", "German": "de", "Spanish": "es",
         "Russian": "ru", "Chinese": "zh", "Italian": "it", "Portuguese": "pt",
         "Dutch": "nl", "Japanese": "jap", "Arabic": "ar", "Hindi": "hi",
     }
 
-    def __init__(self, from_lang_name, to_lang_name, status_callback=None):
-        super().__init__(from_lang_name, to_lang_name, status_callback)
+    def __init__(self, from_lang_name, to_lang_name, status_callback=None, cache=None, num_beams=None,
+                 max_new_tokens=None, quantize=False, num_threads=None):
+        super().__init__(from_lang_name, to_lang_name, status_callback, cache)
         self.model = None
         self.tokenizer = None
         self.model_name = None
+        # None keeps the model's own generation config (usually 4 beams); 1 is greedy decoding.
+        self.generate_kwargs = {}
+        if num_beams:
+            self.generate_kwargs['num_beams'] = int(num_beams)
+        if max_new_tokens:
+            self.generate_kwargs['max_new_tokens'] = int(max_new_tokens)
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.cache_backend = (f"{self.BACKEND}:beams={num_beams or 'default'}:max_new_tokens={max_new_tokens or 'default'}"
+                              f":int8={bool(quantize)}")
         self.check_model()
 
     def check_model(self):
@@ -103,26 +326,34 @@ class MarianTranslator(BaseTranslator):
         self._update_status(f"Checking for MarianMT model: {self.model_name}...", "gray")
 
         try:
-            # from_pretrained checks local cache first. This avoids re-downloading.
-            self.tokenizer = MarianTokenizer.from_pretrained(self.model_name)
-            self.model = MarianMTModel.from_pretrained(self.model_name)
+            import torch
+            if self.num_threads:
+                # Leave the remaining cores to Vosk instead of letting torch claim all of them.
+                torch.set_num_threads(int(self.num_threads))
+            # Shared with every other translator (and status check) for the same model.
+            self.tokenizer, self.model = model_registry.marian_model(self.model_name, self.quantize)
+            self.registry_key = marian_key(self.model_name, self.quantize)
             self._update_status(f"MarianMT model '{self.model_name}' is ready.", "green")
             self.is_ready = True
         except Exception:
             self._update_status(f"Model '{self.model_name}' not found. Download from Settings.", "orange")
             self.is_ready = False
 
-    def translate(self, text):
-        if not self.is_ready or not self.model or not self.tokenizer:
-            return f"[No MarianMT Model] {text}"
+    def _generate(self, tokenized):
+        import torch
+        with torch.inference_mode():
+            return self.model.generate(**tokenized, **self.generate_kwargs)
 
-        try:
-            tokenized_text = self.tokenizer(text, return_tensors="pt", padding=True)
-            translated_tokens = self.model.generate(**tokenized_text)
-            return self.tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
-        except Exception as e:
-            print(f"MarianMT translation error: {e}")
-            return f"[MarianMT Error] {text}"
+    def _translate(self, text):
+        tokenized_text = self.tokenizer(text, return_tensors="pt", padding=True)
+        translated_tokens = self._generate(tokenized_text)
+        return self.tokenizer.decode(translated_tokens[0], skip_special_tokens=True)
+
+    def _translate_batch(self, texts):
+        # One padded generate() call for the whole batch instead of one per text.
+        tokenized_texts = self.tokenizer(texts, return_tensors="pt", padding=True)
+        translated_tokens = self._generate(tokenized_texts)
+        return self.tokenizer.batch_decode(translated_tokens, skip_special_tokens=True)
 
 
 def get_translator(settings, status_callback=None):
@@ -134,10 +365,16 @@ def get_translator(settings, status_callback=None):
     from_lang = settings.get("language", "English").split(" ")[0]
     to_lang = settings.get("translation_target_language", "Spanish")
 
+    cache = get_translation_cache(settings)
+
     if backend == "ArgosTranslate":
-        return ArgosTranslator(from_lang, to_lang, status_callback)
+        return ArgosTranslator(from_lang, to_lang, status_callback, cache)
     elif backend == "MarianMT":
-        return MarianTranslator(from_lang, to_lang, status_callback)
+        return MarianTranslator(from_lang, to_lang, status_callback, cache,
+                                num_beams=settings.get("marian_num_beams"),
+                                max_new_tokens=settings.get("marian_max_new_tokens"),
+                                quantize=settings.get("marian_quantize", False),
+                                num_threads=settings.get("torch_num_threads"))
 
     return None
 
@@ -145,6 +382,7 @@ def get_translator(settings, status_callback=None):
 def get_available_argos_languages():
     """Helper to get a list of all unique language names from Argos packages."""
     try:
+        import argostranslate.package
         argostranslate.package.update_package_index()
         packages = argostranslate.package.get_available_packages()
         lang_names = set()